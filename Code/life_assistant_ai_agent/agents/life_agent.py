@@ -1,12 +1,132 @@
 """
 本地服务推荐助手：结合时间、地理、日程，推送本地生活建议。
+本地信息由多个可插拔 provider 并发获取，每个 provider 有独立超时与 TTL 缓存，
+超时的 provider 不阻塞整体结果（返回部分结果），总延迟取决于最慢的允许超时而非各 provider 之和。
 """
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from datetime import date as date_cls
+from utils.api_utils import get_weather, get_holiday, get_events
+from utils.cache import TTLCache
+from utils.openai_api import call_openai
+
+_MISS = object()
+
+
+class LocalInfoProvider:
+    """
+    本地信息 provider 基类：子类实现 fetch(location, day)。
+    name 为结果中的键名，timeout 为该 provider 允许的最长耗时（秒），ttl 为缓存时间（秒）。
+    """
+    name = "base"
+    timeout = 3.0
+    ttl = 600
+
+    def fetch(self, location, day):
+        raise NotImplementedError
+
+
+class WeatherProvider(LocalInfoProvider):
+    name = "weather"
+    timeout = 3.0
+    ttl = 600
+
+    def fetch(self, location, day):
+        return get_weather(location, timeout=self.timeout)
+
+
+class HolidayProvider(LocalInfoProvider):
+    name = "holiday"
+    timeout = 0.5
+    ttl = 24 * 3600
+
+    def fetch(self, location, day):
+        return get_holiday(day, country='JP')
+
+
+class EventProvider(LocalInfoProvider):
+    name = "events"
+    timeout = 2.0
+    ttl = 3600
+
+    def fetch(self, location, day):
+        return get_events(location, day)
+
+
+def default_providers():
+    return [WeatherProvider(), HolidayProvider(), EventProvider()]
+
+
 class LifeAgent:
-    def __init__(self):
-        pass
-    def fetch_local_info(self, location):
-        """获取本地天气、节日等信息"""
-        pass
-    def recommend_activity(self, user_schedule):
+    def __init__(self, providers=None, max_workers=8):
+        self.providers = providers if providers is not None else default_providers()
+        # 长期复用的线程池：超时的 provider 在后台自行结束，不阻塞调用方
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="life-agent")
+        self.cache = TTLCache(ttl=600)
+
+    def _fetch_one(self, provider, location, day):
+        result = provider.fetch(location, day)
+        self.cache.set((provider.name, location, day), result, ttl=provider.ttl)
+        return result
+
+    def fetch_local_info(self, location, day=None):
+        """
+        获取本地天气、节日等信息
+        :return: dict，包含各 provider 结果、date、location，以及 missing（超时或出错的 provider 及原因）
+        """
+        if day is None:
+            day = date_cls.today()
+        if not isinstance(day, str):
+            day = day.isoformat()
+        info = {"location": location, "date": day, "missing": {}}
+        pending = []
+        for p in self.providers:
+            cached = self.cache.get((p.name, location, day), _MISS)
+            if cached is not _MISS:
+                info[p.name] = cached
+            else:
+                pending.append((p, self._executor.submit(self._fetch_one, p, location, day)))
+        start = time.monotonic()
+        for p, fut in pending:
+            remaining = max(0.0, start + p.timeout - time.monotonic())
+            try:
+                info[p.name] = fut.result(timeout=remaining)
+            except FutureTimeoutError:
+                info["missing"][p.name] = "timeout"
+            except Exception as e:
+                info["missing"][p.name] = f"error: {e}"
+        return info
+
+    def build_prompt(self, user_schedule, info):
+        lines = [f"地点：{info['location']}，日期：{info['date']}"]
+        if "weather" in info:
+            w = info["weather"]
+            lines.append(f"天气：{w.get('description')}，气温 {w.get('temp_c')}℃")
+        if info.get("holiday"):
+            lines.append(f"今日节假日：{info['holiday']}")
+        if info.get("events"):
+            lines.append(f"当季活动：{'、'.join(info['events'])}")
+        if isinstance(user_schedule, (list, tuple)):
+            schedule_text = "\n".join(f"- {s}" for s in user_schedule) or "无"
+        else:
+            schedule_text = user_schedule or "无"
+        local_text = "\n".join(lines)
+        return f"""
+你是一个在日生活助理，请结合以下本地信息和用户日程，推荐2-3个适合今天的活动，并简要说明理由。
+本地信息：
+{local_text}
+用户日程：
+{schedule_text}
+请输出格式：
+1. 活动A - 推荐理由
+2. 活动B - 推荐理由
+"""
+
+    def recommend_activity(self, user_schedule, location="Tokyo", day=None):
         """根据用户日程推荐活动"""
-        pass
\ No newline at end of file
+        info = self.fetch_local_info(location, day)
+        return call_openai(self.build_prompt(user_schedule, info), call_site="recommend")
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
@@ -6,23 +6,44 @@ import sqlite3
 import yaml
 import os
 import signal
+import threading
 from datetime import datetime
-from utils.openai_api import call_openai
+from utils.openai_api import call_openai, acall_openai
 from config import DATABASE_PATH
 from pathlib import Path
-from utils.user_profile_utils import parse_user_profile_from_llm, parse_memory_summary_from_llm
+from utils.user_profile_utils import parse_user_profile_from_llm, parse_memory_summary_from_llm, parse_combined_extraction_from_llm
+from utils.db_utils import ensure_time_columns, conversations_active_in_last
+from utils.time_utils import to_epoch
+from utils.messages import Message, MessageHistory, CHAT_ROLES
 import json
 
+MEMORY_PATH = Path(__file__).parent.parent / "memory" / "user_memory.yaml"
+
+# 多会话（如 chat_server）同进程运行时，串行化对 user_memory.yaml 的所有读取与读改写，
+# 避免并发写入时丢失更新或读到写了一半的文件
+_YAML_LOCK = threading.Lock()
+
+# _load_user_profile 的只读解析缓存：(path, mtime_ns, size, data)，文件未变化时多个会话共用一次解析结果
+_yaml_snapshot = None
+
+PROFILE_UPDATE_SQL = "UPDATE users SET name=?, age=?, gender=?, education=?, occupation=?, city=?, interests=?, language=?, nationality=?, extra_information=? WHERE id=?"
+
 class MemoryAgent:
-    def __init__(self, user_id, page_size=5):
+    def __init__(self, user_id, page_size=5, db_path=DATABASE_PATH, register_signals=True):
+        """
+        :param register_signals: 是否注册 SIGINT/SIGTERM 退出保存（进程级，单用户 CLI 使用；服务端多会话时关闭）
+        """
         self.user_id = user_id
         self.page_size = page_size
-        self.conn = sqlite3.connect(DATABASE_PATH)
+        # 服务端会在线程池中调用同一会话的方法（同一时刻只有一个），因此允许跨线程使用连接
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
         self.conn.row_factory = sqlite3.Row
-        self.messages = []
+        ensure_time_columns(self.conn)
+        self.messages = MessageHistory()
         self.group_id = self._get_latest_group_id()
         self._load_user_profile()
         self._dirty = False # 提前初始化
+        self._saved_message_count = 0
         # ===== 逻辑说明 =====
         # 如果该用户有历史对话组（group_id > 0），则自动载入最新 group_id 的历史消息，
         # 这样 show_history 能正常显示历史内容，用户无需手动 /switch。
@@ -31,9 +52,8 @@ class MemoryAgent:
             self.switch_conversation(self.group_id)
         else:
             self._init_messages(is_new=True)
-        self._register_signal()
-        # self._dirty = False
-        self._saved_message_count = 0
+        if register_signals:
+            self._register_signal()
 
     def _get_latest_group_id(self):
         cursor = self.conn.cursor()
@@ -43,30 +63,45 @@ class MemoryAgent:
 
     def _load_user_profile(self):
         # 读取yaml缓存，加载用户画像和记忆摘要
-        memory_path = Path(__file__).parent.parent / "memory" / "user_memory.yaml"
+        memory_path = MEMORY_PATH
         self.user_profile = ""
         self.memory_summary = ""
+        # 记录用户是否在 YAML 缓存中，不在时保存对话无需再解析 YAML
+        self._in_yaml = False
         if memory_path.exists():
-            with open(memory_path, "r", encoding="utf-8") as f:
-                data = yaml.safe_load(f)
-            for u in data.get("users", []):
+            for u in self._read_yaml_snapshot(memory_path).get("users", []):
                 if u["user_profile"]["user_id"] == self.user_id:
                     self.user_profile = self._profile_to_str(u["user_profile"])
                     if u.get("memory_summaries"):
                         self.memory_summary = u["memory_summaries"][-1]["summary"]
+                    self._in_yaml = True
                     break
 
+    @staticmethod
+    def _read_yaml_snapshot(memory_path):
+        """
+        只读解析 YAML，文件未变化（mtime/size 相同）时直接复用上次的结果，调用方不得修改返回值
+        """
+        global _yaml_snapshot
+        with _YAML_LOCK:
+            st = memory_path.stat()
+            key = (memory_path, st.st_mtime_ns, st.st_size)
+            if _yaml_snapshot is None or _yaml_snapshot[:3] != key:
+                with open(memory_path, "r", encoding="utf-8") as f:
+                    _yaml_snapshot = key + (yaml.safe_load(f) or {},)
+            return _yaml_snapshot[3]
+
     def _profile_to_str(self, profile):
-        return f"Name: {profile.get('name','')}, Age: {profile.get('age','')}, Gender: {profile.get('gender','')}, Education: {profile.get('education','')}, Occupation: {profile.get('occupation','')}, Interests: {','.join(profile.get('interests',[]))}, Language: {','.join(profile.get('language',[]))}, Nationality: {profile.get('nationality','')}"
+        return f"Name: {profile.get('name','')}, Age: {profile.get('age','')}, Gender: {profile.get('gender','')}, Education: {profile.get('education','')}, Occupation: {profile.get('occupation','')}, Interests: {','.join(profile.get('interests') or [])}, Language: {','.join(profile.get('language') or [])}, Nationality: {profile.get('nationality','')}"
 
     def _init_messages(self, is_new=True):
-        self.messages = []
+        self.messages = MessageHistory()
         if is_new:
-            self.messages.append({"role": "system", "content": "You are a life assistant, good at summarizing and giving advice."})
+            self.messages.append(Message("system", "You are a life assistant, good at summarizing and giving advice.", preamble=True))
             if self.user_profile:
-                self.messages.append({"role": "user", "content": f"[User Profile] {self.user_profile}"})
+                self.messages.append(Message("user", f"[User Profile] {self.user_profile}", preamble=True))
             if self.memory_summary:
-                self.messages.append({"role": "user", "content": f"[Memory Summary] {self.memory_summary}"})
+                self.messages.append(Message("user", f"[Memory Summary] {self.memory_summary}", preamble=True))
 
     def _register_signal(self):
         def handler(sig, frame):
@@ -78,20 +113,46 @@ class MemoryAgent:
         signal.signal(signal.SIGTERM, handler)
 
     def ask(self, question):
-        self.messages.append({"role": "user", "content": question})
-        answer = call_openai(self.messages)
-        self.messages.append({"role": "assistant", "content": answer})
+        self.messages.append(Message("user", question))
+        try:
+            answer = call_openai(self.messages, call_site="chat")
+        except Exception:
+            # 请求失败（超时/重试耗尽）时撤回本轮提问，已有对话不受影响，可直接重试
+            self.messages.pop()
+            raise
+        self.messages.append(Message("assistant", answer))
         self._dirty = True
         return answer
 
+    async def aask(self, question):
+        """ask 的 asyncio 版本，供 chat_server 使用"""
+        self.messages.append(Message("user", question))
+        try:
+            answer = await acall_openai(self.messages, call_site="chat")
+        except BaseException:
+            # 包括调用方被取消（CancelledError），避免未回答的提问随下次保存写入数据库
+            self.messages.pop()
+            raise
+        self.messages.append(Message("assistant", answer))
+        self._dirty = True
+        return answer
+
+    def close(self):
+        """保存未落盘的对话并关闭数据库连接"""
+        if self._dirty:
+            self.save()
+        self.conn.close()
+
     def save(self):
-        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        now_dt = datetime.now()
+        now = now_dt.strftime("%Y-%m-%d %H:%M:%S")
+        now_ts = to_epoch(now_dt)
         cursor = self.conn.cursor()
         for msg in self.messages[self._saved_message_count:]:
-            if msg["role"] in ("user", "assistant") and not (isinstance(msg["content"], str) and (msg["content"].startswith("[User Profile]") or msg["content"].startswith("[Memory Summary]"))):
+            if msg.role in CHAT_ROLES and not msg.preamble:
                 cursor.execute(
-                    "INSERT INTO conversations (user_id, group_id, role, content, timestamp, tags) VALUES (?, ?, ?, ?, ?, ?) ",
-                    (self.user_id, self.group_id, msg["role"], msg["content"], now, "")
+                    "INSERT INTO conversations (user_id, group_id, role, content, timestamp, timestamp_ts, tags) VALUES (?, ?, ?, ?, ?, ?, ?) ",
+                    (self.user_id, self.group_id, msg.role, msg.content, now, now_ts, "")
                 )
         self.conn.commit()
         self._saved_message_count = len(self.messages)
@@ -99,20 +160,22 @@ class MemoryAgent:
         self._dirty = False
 
     def _update_yaml_cache(self):
-        memory_path = Path(__file__).parent.parent / "memory" / "user_memory.yaml"
-        if not memory_path.exists():
+        memory_path = MEMORY_PATH
+        # 用户不在 YAML 缓存中时不解析、不重写整个文件
+        if not self._in_yaml or not memory_path.exists():
             return
-        with open(memory_path, "r", encoding="utf-8") as f:
-            data = yaml.safe_load(f)
-        for u in data.get("users", []):
-            if u["user_profile"]["user_id"] == self.user_id:
-                # 只缓存最近一组对话
-                u["conversations"] = [{
-                    "group_id": self.group_id,
-                    "messages": [m for m in self.messages if m["role"] in ("user", "assistant")]
-                }]
-        with open(memory_path, "w", encoding="utf-8") as f:
-            yaml.safe_dump(data, f, allow_unicode=True)
+        with _YAML_LOCK:
+            with open(memory_path, "r", encoding="utf-8") as f:
+                data = yaml.safe_load(f)
+            for u in data.get("users", []):
+                if u["user_profile"]["user_id"] == self.user_id:
+                    # 只缓存最近一组对话
+                    u["conversations"] = [{
+                        "group_id": self.group_id,
+                        "messages": [m.to_dict() for m in self.messages if m.role in CHAT_ROLES]
+                    }]
+            with open(memory_path, "w", encoding="utf-8") as f:
+                yaml.safe_dump(data, f, allow_unicode=True)
 
     def new_conversation(self):
         """
@@ -129,14 +192,21 @@ class MemoryAgent:
         分页显示对话历史，当前为正序分页（旧→新）。如需倒序分页，将下方注释取消。
         :param page: 页码，从1开始
         """
-        msgs = [m for m in self.messages if m["role"] in ("user", "assistant") and not (isinstance(m["content"], str) and (m["content"].startswith("[User Profile]") or m["content"].startswith("[Memory Summary]")))]
+        items, total_pages = self.get_history(page)
+        for idx, m in items:
+            print(f"[{idx}] {m.role}: {m.content}")
+        print(f"-- Page {page} of {total_pages} --")
+
+    def get_history(self, page=1):
+        """
+        返回 ([(序号, Message), ...], 总页数)
+        """
+        msgs = self.messages.chat_messages()
         # msgs = list(reversed(msgs))  # 如需倒序分页（新→旧），取消本行注释
         total = len(msgs)
         start = (page-1)*self.page_size
         end = min(start+self.page_size, total)
-        for idx, m in enumerate(msgs[start:end], start=start+1):
-            print(f"[{idx}] {m['role']}: {m['content']}")
-        print(f"-- Page {page} of {(total-1)//self.page_size+1} --")
+        return list(enumerate(msgs[start:end], start=start+1)), (total-1)//self.page_size+1
 
     def switch_conversation(self, group_id):
         """
@@ -153,7 +223,7 @@ class MemoryAgent:
         self.group_id = group_id
         self._init_messages(is_new=False)
         for r in rows:
-            self.messages.append({"role": r["role"], "content": r["content"]})
+            self.messages.append(Message(r["role"], r["content"]))
         self._saved_message_count = len(self.messages)
 
     def list_conversations(self):
@@ -174,23 +244,34 @@ class MemoryAgent:
         """结合记忆体生成个性化回答"""
         pass
 
-    def summarize_user_memory(self, period=None, n_messages=20):
+    def _fetch_history(self, n_messages, days=None):
         """
-        生成记忆摘要，写入数据库和YAML
-        :param period: 时间段描述（如'2024-06-01~2024-06-07'），可选
-        :param n_messages: 选取最近多少条对话
-        暂时默认提取末尾20条对话，后期可以改为根据用户画像中的last_active字段，提取最近n_messages条对话
+        取最近 n_messages 条对话内容（正序拼接）；指定 days 时只取最近 days 天内的对话（走时间索引）。
         """
+        if days is not None:
+            rows = conversations_active_in_last(self.conn, self.user_id, days, limit=n_messages, columns="content")
+            return "\n".join([r[0] for r in rows])
         cursor = self.conn.cursor()
         cursor.execute(
             "SELECT content FROM conversations WHERE user_id=? ORDER BY id DESC LIMIT ?",
             (self.user_id, n_messages)
         )
         rows = cursor.fetchall()
-        history = "\n".join([r[0] for r in reversed(rows)])
+        return "\n".join([r[0] for r in reversed(rows)])
+
+    def summarize_user_memory(self, period=None, n_messages=20, days=None):
+        """
+        生成记忆摘要，写入数据库和YAML
+        :param period: 时间段描述（如'2024-06-01~2024-06-07'），可选
+        :param n_messages: 选取最近多少条对话
+        :param days: 只选取最近多少天内的对话，可选
+        暂时默认提取末尾20条对话，后期可以改为根据用户画像中的last_active字段，提取最近n_messages条对话
+        """
+        cursor = self.conn.cursor()
+        history = self._fetch_history(n_messages, days)
         # 生成prompt
         prompt = f"""You are a smart life assistant for Japanese students/workers, please summarize the main concerns, interests, problems, action plans, habits, emotional states of the user based on the following conversation history. Please combine Japanese daily life, study, work, visa, social, health, travel, etc. themes, and try to summarize as detailed as possible. If something cannot be inferred from the conversation, please output NULL.\n\nConversation history:\n{history}\n\nPlease strictly output the following JSON format, without any explanation, code block mark or other content. For example:\n{{\n  \"Main Concerns\": \"...\",\n  \"Interests\": \"...\",\n  ...\n}}"""
-        summary_text = call_openai(prompt)
+        summary_text = call_openai(prompt, call_site="summary")
         summary_dict = parse_memory_summary_from_llm(summary_text)
         now = datetime.now().strftime("%Y-%m-%d")
         # 写入数据库
@@ -200,25 +281,16 @@ class MemoryAgent:
         )
         self.conn.commit()
         # 写入YAML
-        memory_path = Path(__file__).parent.parent / "memory" / "user_memory.yaml"
+        memory_path = MEMORY_PATH
         if memory_path.exists():
-            with open(memory_path, "r", encoding="utf-8") as f:
-                data = yaml.safe_load(f)
-            for u in data.get("users", []):
-                if u["user_profile"]["user_id"] == self.user_id:
-                    if "memory_summaries" not in u:
-                        u["memory_summaries"] = []
-                    u["memory_summaries"].append({
-                        "summary_id": int(now.replace("-", "")),
-                        "period": period or "recent",
-                        "summary": summary_text,
-                        "created_at": now,
-                        "revised_by_user": False,
-                        "revised_content": "",
-                        "revised_at": None
-                    })
-            with open(memory_path, "w", encoding="utf-8") as f:
-                yaml.safe_dump(data, f, allow_unicode=True)
+            with _YAML_LOCK:
+                with open(memory_path, "r", encoding="utf-8") as f:
+                    data = yaml.safe_load(f)
+                for u in data.get("users", []):
+                    if u["user_profile"]["user_id"] == self.user_id:
+                        u.setdefault("memory_summaries", []).append(self._summary_yaml_entry(summary_text, period, now))
+                with open(memory_path, "w", encoding="utf-8") as f:
+                    yaml.safe_dump(data, f, allow_unicode=True)
 
     def manual_profile_entry(self):
         """
@@ -242,29 +314,25 @@ class MemoryAgent:
         )
         self.conn.commit()
         # Write to YAML
-        memory_path = Path(__file__).parent.parent / "memory" / "user_memory.yaml"
+        memory_path = MEMORY_PATH
         if memory_path.exists():
-            with open(memory_path, "r", encoding="utf-8") as f:
-                data = yaml.safe_load(f)
-            for u in data.get("users", []):
-                if u["user_profile"]["user_id"] == self.user_id:
-                    u["user_profile"].update(profile)
-            with open(memory_path, "w", encoding="utf-8") as f:
-                yaml.safe_dump(data, f, allow_unicode=True)
+            with _YAML_LOCK:
+                with open(memory_path, "r", encoding="utf-8") as f:
+                    data = yaml.safe_load(f)
+                for u in data.get("users", []):
+                    if u["user_profile"]["user_id"] == self.user_id:
+                        u["user_profile"].update(profile)
+                with open(memory_path, "w", encoding="utf-8") as f:
+                    yaml.safe_dump(data, f, allow_unicode=True)
 
-    def auto_generate_profile(self, n_messages=30):
+    def auto_generate_profile(self, n_messages=30, days=None):
         """
         自动生成用户画像，写入数据库和YAML
         """
         cursor = self.conn.cursor()
-        cursor.execute(
-            "SELECT content FROM conversations WHERE user_id=? ORDER BY id DESC LIMIT ?",
-            (self.user_id, n_messages)
-        )
-        rows = cursor.fetchall()
-        history = "\n".join([r[0] for r in reversed(rows)])
+        history = self._fetch_history(n_messages, days)
         prompt = f"""You are a smart life assistant for Japanese students/workers, please infer and structure output the basic profile information of the user based on the following conversation history. Each field will output NULL if it cannot be inferred. Output in JSON format.\n\nFields include:\n- Name\n- Age\n- Gender\n- Education\n- Occupation\n- City\n- Interests (List)\n- Language (List)\n- Nationality\n- Contact Information\n- Common Apps (e.g., WeChat, Line, etc.)\n- Lifestyle Preferences (e.g., Diet, Routine, Exercise, etc.)\n\nConversation history:\n{history}\n\nPlease strictly output the following JSON format, without any explanation, code block mark or other content. For example:\n{{\n  \"Name\": \"Zhang San\",\n  \"Age\": 24,\n  ...\n}}"""
-        profile_json = call_openai(prompt)
+        profile_json = call_openai(prompt, call_site="profile")
         print("[DEBUG] LLM returned content:", profile_json)  # Debug use
         try:
             profile_dict = parse_user_profile_from_llm(profile_json)
@@ -273,47 +341,115 @@ class MemoryAgent:
             print("Original return:", profile_json)
             return
         # Fallback processing: Use LLM results first, if None, then try to read original user_profile from YAML, if still None, use default values
-        memory_path = Path(__file__).parent.parent / "memory" / "user_memory.yaml"
+        memory_path = MEMORY_PATH
         yaml_profile = {}
         if memory_path.exists():
-            with open(memory_path, "r", encoding="utf-8") as f:
-                data = yaml.safe_load(f)
+            with _YAML_LOCK:
+                with open(memory_path, "r", encoding="utf-8") as f:
+                    data = yaml.safe_load(f)
             for u in data.get("users", []):
                 if u["user_profile"]["user_id"] == self.user_id:
                     yaml_profile = u["user_profile"]
                     break
+        cursor.execute(PROFILE_UPDATE_SQL, self._profile_update_params(profile_dict, yaml_profile))
+        self.conn.commit()
+        # Write to YAML
+        memory_path = MEMORY_PATH
+        if memory_path.exists():
+            with _YAML_LOCK:
+                with open(memory_path, "r", encoding="utf-8") as f:
+                    data = yaml.safe_load(f)
+                for u in data.get("users", []):
+                    if u["user_profile"]["user_id"] == self.user_id:
+                        self._apply_profile_to_yaml(u["user_profile"], profile_dict)
+                with open(memory_path, "w", encoding="utf-8") as f:
+                    yaml.safe_dump(data, f, allow_unicode=True)
+
+    def _profile_update_params(self, profile_dict, yaml_profile):
+        """
+        PROFILE_UPDATE_SQL 的参数：优先使用 LLM 结果，为空时回退到 YAML 中的原画像
+        """
         # Fallback logic for NOT NULL fields
         name = profile_dict.get("name") or yaml_profile.get("name") or "Unknown"
         age = profile_dict.get("age") or yaml_profile.get("age") or 0
         # ... Other fields can be fallback as needed ...
-        cursor.execute(
-            "UPDATE users SET name=?, age=?, gender=?, education=?, occupation=?, city=?, interests=?, language=?, nationality=?, extra_information=? WHERE id=?",
-            (
-                name,
-                age,
-                profile_dict.get("gender") or yaml_profile.get("gender"),
-                profile_dict.get("education") or yaml_profile.get("education"),
-                profile_dict.get("occupation") or yaml_profile.get("occupation"),
-                profile_dict.get("city") or yaml_profile.get("city"),
-                ",".join(profile_dict.get("interests", [])) if profile_dict.get("interests") else ",".join(yaml_profile.get("interests", [])) if yaml_profile.get("interests") else None,
-                ",".join(profile_dict.get("language", [])) if profile_dict.get("language") else ",".join(yaml_profile.get("language", [])) if yaml_profile.get("language") else None,
-                profile_dict.get("nationality") or yaml_profile.get("nationality"),
-                json.dumps(profile_dict.get("extra_information"), ensure_ascii=False) if profile_dict.get("extra_information") else None,
-                self.user_id
-            )
+        return (
+            name,
+            age,
+            profile_dict.get("gender") or yaml_profile.get("gender"),
+            profile_dict.get("education") or yaml_profile.get("education"),
+            profile_dict.get("occupation") or yaml_profile.get("occupation"),
+            profile_dict.get("city") or yaml_profile.get("city"),
+            ",".join(profile_dict.get("interests", [])) if profile_dict.get("interests") else ",".join(yaml_profile.get("interests", [])) if yaml_profile.get("interests") else None,
+            ",".join(profile_dict.get("language", [])) if profile_dict.get("language") else ",".join(yaml_profile.get("language", [])) if yaml_profile.get("language") else None,
+            profile_dict.get("nationality") or yaml_profile.get("nationality"),
+            json.dumps(profile_dict.get("extra_information"), ensure_ascii=False) if profile_dict.get("extra_information") else None,
+            self.user_id
         )
-        self.conn.commit()
-        # Write to YAML
-        memory_path = Path(__file__).parent.parent / "memory" / "user_memory.yaml"
-        if memory_path.exists():
-            with open(memory_path, "r", encoding="utf-8") as f:
-                data = yaml.safe_load(f)
-            for u in data.get("users", []):
-                if u["user_profile"]["user_id"] == self.user_id:
-                    for k in profile_dict:
-                        if k != "extra_information":
-                            u["user_profile"][k] = profile_dict[k]
-                    if profile_dict.get("extra_information"):
-                        u["user_profile"]["extra_information"] = profile_dict["extra_information"]
-            with open(memory_path, "w", encoding="utf-8") as f:
-                yaml.safe_dump(data, f, allow_unicode=True)
\ No newline at end of file
+
+    def _apply_profile_to_yaml(self, yaml_profile, profile_dict):
+        # 与 _profile_update_params 一致：LLM 结果为空（NULL）时保留原值，YAML 与数据库不出现分歧
+        for k in profile_dict:
+            if k != "extra_information" and profile_dict[k]:
+                yaml_profile[k] = profile_dict[k]
+        if profile_dict.get("extra_information"):
+            yaml_profile["extra_information"] = profile_dict["extra_information"]
+
+    def _summary_yaml_entry(self, summary_text, period, now):
+        return {
+            "summary_id": int(now.replace("-", "")),
+            "period": period or "recent",
+            "summary": summary_text,
+            "created_at": now,
+            "revised_by_user": False,
+            "revised_content": "",
+            "revised_at": None
+        }
+
+    def refresh_profile_and_memory(self, period=None, n_messages=30, days=None):
+        """
+        一次完成用户画像与记忆摘要的更新（替代先后调用 auto_generate_profile 和 summarize_user_memory）：
+        只查询一次对话历史、只调用一次 LLM（结构化输出 profile + memory_summary），
+        users / memory_summaries 在同一事务中写入，YAML 只读写一次。
+        :return: (profile_dict, summary_dict)，解析失败时返回 None
+        """
+        history = self._fetch_history(n_messages, days)
+        prompt = f"""You are a smart life assistant for Japanese students/workers. Based on the following conversation history, do two things in one answer:\n1. "profile": infer the user's basic profile. Use exactly these keys: name, age, gender, education, occupation, city, interests (list), language (list), nationality. You may add extra keys such as "Contact Information", "Common Apps" (e.g., WeChat, Line, etc.), "Lifestyle Preferences" (e.g., Diet, Routine, Exercise, etc.).\n2. "memory_summary": summarize the user's main concerns, interests, problems, action plans, habits and emotional states, combining Japanese daily life, study, work, visa, social, health, travel, etc. themes, as detailed as possible.\nOutput NULL for anything that cannot be inferred.\n\nConversation history:\n{history}\n\nPlease strictly output the following JSON format, without any explanation, code block mark or other content. For example:\n{{\n  \"profile\": {{\"name\": \"Zhang San\", \"age\": 24, ...}},\n  \"memory_summary\": {{\"Main Concerns\": \"...\", \"Interests\": \"...\", ...}}\n}}"""
+        result_text = call_openai(prompt, call_site="profile")
+        try:
+            profile_dict, summary_dict = parse_combined_extraction_from_llm(result_text)
+        except Exception:
+            print("Failed to refresh profile and memory, LLM returned content cannot be parsed as JSON. Please try again or check the Prompt.")
+            print("Original return:", result_text)
+            return None
+        summary_text = json.dumps(summary_dict, ensure_ascii=False)
+        now = datetime.now().strftime("%Y-%m-%d")
+        memory_path = MEMORY_PATH
+        # YAML 的读取到写回之间持锁，避免覆盖其他会话在此期间的写入
+        with _YAML_LOCK:
+            data, yaml_user = None, None
+            if memory_path.exists():
+                with open(memory_path, "r", encoding="utf-8") as f:
+                    data = yaml.safe_load(f)
+                for u in data.get("users", []):
+                    if u["user_profile"]["user_id"] == self.user_id:
+                        yaml_user = u
+                        break
+            yaml_profile = yaml_user["user_profile"] if yaml_user else {}
+            # 数据库：画像与摘要在同一事务中写入
+            with self.conn:
+                self.conn.execute(PROFILE_UPDATE_SQL, self._profile_update_params(profile_dict, yaml_profile))
+                self.conn.execute(
+                    "INSERT INTO memory_summaries (user_id, period, summary, created_at, revised_by_user, revised_content, revised_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (self.user_id, period or "recent", summary_text, now, 0, "", None)
+                )
+            # YAML：一次读改写
+            if yaml_user:
+                self._apply_profile_to_yaml(yaml_user["user_profile"], profile_dict)
+                yaml_user.setdefault("memory_summaries", []).append(self._summary_yaml_entry(summary_text, period, now))
+                with open(memory_path, "w", encoding="utf-8") as f:
+                    yaml.safe_dump(data, f, allow_unicode=True)
+        if yaml_user:
+            self.user_profile = self._profile_to_str(yaml_user["user_profile"])
+        self.memory_summary = summary_text
+        return profile_dict, summary_dict
\ No newline at end of file
@@ -5,20 +5,25 @@ AI提醒助手：负责任务的记录、分类、优先级分析与提醒策略
 import sqlite3
 from config import DATABASE_PATH
 from utils.openai_api import call_openai
+from utils.db_utils import ensure_time_columns, reminders_due_between, reminders_undated
+from utils.time_utils import week_window
 
 class ReminderAgent:
-    def __init__(self, user_id):
+    def __init__(self, user_id, db_path=DATABASE_PATH):
         self.user_id = user_id
-        self.conn = sqlite3.connect(DATABASE_PATH)
+        self.conn = sqlite3.connect(db_path)
         self.conn.row_factory = sqlite3.Row
+        ensure_time_columns(self.conn)
 
-    def fetch_reminders(self):
-        cursor = self.conn.cursor()
-        cursor.execute(
-            "SELECT title, description, due_date, priority, status FROM reminders WHERE user_id=? AND status='待办' ORDER BY due_date ASC",
-            (self.user_id,)
-        )
-        reminders = cursor.fetchall()
+    def fetch_reminders(self, start=None, end=None, include_undated=False):
+        """
+        查询待办事项，start/end 为 epoch 秒（[start, end)），均为 None 时返回全部待办。
+        走 (user_id, status, due_ts) 索引范围扫描。
+        """
+        reminders = reminders_due_between(self.conn, self.user_id, start, end)
+        # 无上下界时 NULL 行已包含在结果中
+        if include_undated and (start is not None or end is not None):
+            reminders += reminders_undated(self.conn, self.user_id)
         return reminders
 
     def generate_prompt(self, reminders):
@@ -39,11 +44,12 @@ class ReminderAgent:
         return prompt
 
     def get_smart_reminders(self):
-        reminders = self.fetch_reminders()
+        # 只取已过期 + 本周内到期的事项（以及无截止日期的事项）
+        reminders = self.fetch_reminders(end=week_window()[1], include_undated=True)
         prompt = self.generate_prompt(reminders)
         if prompt == "用户暂无待办事项。":
             return prompt
-        result = call_openai(prompt)
+        result = call_openai(prompt, call_site="reminder")
         return result
 
     def add_task(self, task):
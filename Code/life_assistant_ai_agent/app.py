@@ -3,7 +3,9 @@
 import streamlit as st
 import os
 import yaml
+import requests
 from pathlib import Path
+from config import CHAT_SERVER_URL
 
 # 设置页面配置
 st.set_page_config(
@@ -54,7 +56,7 @@ with st.sidebar:
     # 导航菜单
     page = st.radio(
         "选择功能",
-        ["主页", "提醒事项", "记忆管理", "设置"]
+        ["主页", "对话", "提醒事项", "记忆管理", "设置"]
     )
 
 # 主界面
@@ -78,6 +80,42 @@ if page == "主页":
     else:
         st.info("未找到用户画像信息。")
 
+elif page == "对话":
+    # 瘦客户端：会话状态与 LLM 调用都在 chat_server.py 中，这里只转发请求
+    st.header("AI 对话")
+    chat_user_id = st.number_input("用户ID", min_value=1, value=1, step=1)
+    try:
+        resp = requests.get(f"{CHAT_SERVER_URL}/sessions/{int(chat_user_id)}/history", params={"page": 1}, timeout=10)
+        resp.raise_for_status()
+        history = resp.json()
+        if history["total_pages"] > 1:
+            resp = requests.get(f"{CHAT_SERVER_URL}/sessions/{int(chat_user_id)}/history",
+                                params={"page": history["total_pages"]}, timeout=10)
+            history = resp.json()
+        for m in history["messages"]:
+            with st.chat_message(m["role"]):
+                st.markdown(m["content"])
+    except requests.RequestException as e:
+        st.error(f"无法连接对话服务（{CHAT_SERVER_URL}），请先运行 python chat_server.py：{e}")
+    question = st.chat_input("输入你的问题")
+    if question:
+        with st.chat_message("user"):
+            st.markdown(question)
+        try:
+            resp = requests.post(f"{CHAT_SERVER_URL}/sessions/{int(chat_user_id)}/ask",
+                                 json={"question": question}, timeout=120)
+            data = resp.json()
+            if resp.ok:
+                with st.chat_message("assistant"):
+                    st.markdown(data["answer"])
+            else:
+                st.error(data.get("error", "请求失败"))
+        except requests.RequestException as e:
+            st.error(f"请求失败：{e}")
+    if st.button("保存对话"):
+        requests.post(f"{CHAT_SERVER_URL}/sessions/{int(chat_user_id)}/save", timeout=30)
+        st.success("已保存")
+
 elif page == "提醒事项":
     st.header("提醒事项管理")
     if user_data and user_data.get("reminders"):
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+数据库批量导入/导出工具：备份、迁移、灌入大规模数据。
+- export：按块（fetchmany）流式读取每张表，写出 JSONL/CSV，内存占用与表大小无关
+- import：所有表在单个大事务内 executemany 批量写入，导入前删除各表索引、导入后重建
+- yaml2db：一次性把 memory/user_memory.yaml 中的画像、记忆摘要、提醒事项合并进 SQLite
+每一步都会输出行数、耗时和 rows/s。
+
+用法：
+    python bulk_io.py export backup/ --format jsonl
+    python bulk_io.py import backup/ --tables conversations
+    python bulk_io.py yaml2db
+"""
+import argparse
+import csv
+import json
+import sqlite3
+import time
+from contextlib import contextmanager
+from itertools import islice
+from pathlib import Path
+import yaml
+from config import DATABASE_PATH
+from utils.db_utils import ensure_time_columns, backfill_time_columns
+
+CHUNK_SIZE = 5000
+MEMORY_PATH = Path(__file__).parent / "memory" / "user_memory.yaml"
+
+
+def list_tables(conn):
+    rows = conn.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+    ).fetchall()
+    return [r[0] for r in rows]
+
+
+def _report(action, table, rows, elapsed):
+    rate = rows / elapsed if elapsed > 0 else float("inf")
+    print(f"{action} {table}: {rows} 行，{elapsed:.2f}s，{rate:,.0f} rows/s")
+    return {"table": table, "rows": rows, "seconds": elapsed, "rows_per_sec": rate}
+
+
+def export_table(conn, table, path, fmt="jsonl", chunk_size=CHUNK_SIZE):
+    """
+    流式导出一张表：游标逐块 fetchmany，边读边写，不把整表读入内存。
+    """
+    start = time.perf_counter()
+    cursor = conn.cursor()
+    cursor.execute(f'SELECT * FROM "{table}"')
+    columns = [d[0] for d in cursor.description]
+    count = 0
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = None
+        if fmt == "csv":
+            writer = csv.writer(f)
+            writer.writerow(columns)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            if writer:
+                writer.writerows(rows)
+            else:
+                f.writelines(json.dumps(dict(zip(columns, r)), ensure_ascii=False, default=str) + "\n" for r in rows)
+            count += len(rows)
+    return _report("export", table, count, time.perf_counter() - start)
+
+
+def export_database(db_path, out_dir, fmt="jsonl", tables=None, chunk_size=CHUNK_SIZE):
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    try:
+        return [
+            export_table(conn, t, out_dir / f"{t}.{fmt}", fmt, chunk_size)
+            for t in (tables or list_tables(conn))
+        ]
+    finally:
+        conn.close()
+
+
+def _jsonl_columns(path):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                return list(json.loads(line))
+    return []
+
+
+def _jsonl_rows(path, columns):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                yield tuple(record.get(c) for c in columns)
+
+
+def _csv_columns(path):
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        return next(csv.reader(f), [])
+
+
+def _csv_rows(path):
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        for r in reader:
+            # CSV 不区分空字符串与 NULL，这里统一视为 NULL
+            yield tuple(v if v != "" else None for v in r)
+
+
+def read_records(path):
+    """
+    返回 (列名, 行迭代器)，按行流式读取 JSONL/CSV 文件。
+    """
+    path = Path(path)
+    if path.suffix == ".csv":
+        return _csv_columns(path), _csv_rows(path)
+    columns = _jsonl_columns(path)
+    return columns, _jsonl_rows(path, columns)
+
+
+@contextmanager
+def _transaction(conn):
+    """
+    手动控制的单个事务：正常结束提交，任何异常（包括 KeyboardInterrupt）回滚。
+    """
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None
+    try:
+        conn.execute("BEGIN")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+    finally:
+        conn.isolation_level = isolation_level
+
+
+def _load_table(conn, table, path, drop_indexes, chunk_size):
+    # 在调用方的事务内执行：删除该表索引，executemany 分块写入，再重建索引
+    index_sql = []
+    if drop_indexes:
+        index_sql = conn.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type='index' AND tbl_name=? AND sql IS NOT NULL",
+            (table,)
+        ).fetchall()
+        for name, _ in index_sql:
+            conn.execute(f'DROP INDEX "{name}"')
+    count = 0
+    columns, rows = read_records(path)
+    if columns:
+        col_sql = ", ".join(f'"{c}"' for c in columns)
+        placeholders = ", ".join("?" * len(columns))
+        sql = f'INSERT INTO "{table}" ({col_sql}) VALUES ({placeholders})'
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            conn.executemany(sql, chunk)
+            count += len(chunk)
+    for _, sql in index_sql:
+        conn.execute(sql)
+    return count
+
+
+def import_table(conn, table, path, drop_indexes=True, chunk_size=CHUNK_SIZE):
+    """
+    批量导入一张表：单事务内 executemany 分块写入；导入前删除该表索引，导入后重建。
+    任一步失败则整体回滚（包括索引的删除）。
+    """
+    start = time.perf_counter()
+    with _transaction(conn):
+        count = _load_table(conn, table, Path(path), drop_indexes, chunk_size)
+    return _report("import", table, count, time.perf_counter() - start)
+
+
+def import_database(db_path, in_dir, fmt="jsonl", tables=None, drop_indexes=True, chunk_size=CHUNK_SIZE):
+    """
+    导入目录下的 <表名>.jsonl 或 <表名>.csv 文件，users 表优先导入。
+    所有表在同一个事务内导入，任一张表失败则之前已导入的表也一并回滚。
+    """
+    files = sorted(Path(in_dir).glob(f"*.{fmt}"))
+    files.sort(key=lambda p: p.stem != "users")
+    conn = sqlite3.connect(db_path)
+    try:
+        # 先补齐目标库缺失的列（如旧库没有 users.extra_information），导出文件中的列才能写入
+        ensure_time_columns(conn)
+        stats = []
+        with _transaction(conn):
+            for p in files:
+                if tables is None or p.stem in tables:
+                    start = time.perf_counter()
+                    count = _load_table(conn, p.stem, p, drop_indexes, chunk_size)
+                    stats.append(_report("import", p.stem, count, time.perf_counter() - start))
+        # 回填导入数据中缺失的规范化时间列
+        backfill_time_columns(conn)
+        return stats
+    finally:
+        conn.close()
+
+
+def consolidate_yaml(db_path, yaml_path=MEMORY_PATH):
+    """
+    一次性把 YAML 缓存中的用户画像、记忆摘要、提醒事项合并进 SQLite（单事务）。
+    conversations 在 YAML 中只是最近一组对话的缓存，以数据库为准，不导入。
+    """
+    start = time.perf_counter()
+    with open(yaml_path, "r", encoding="utf-8") as f:
+        data = yaml.safe_load(f) or {}
+    users, summaries, reminders = [], [], []
+    for u in data.get("users", []):
+        p = u["user_profile"]
+        uid = p["user_id"]
+        extra = p.get("extra_information")
+        users.append((
+            uid, p.get("name") or "Unknown", p.get("age"), p.get("gender"), p.get("education"),
+            p.get("occupation"), p.get("city"), ",".join(p.get("interests") or []),
+            ",".join(p.get("language") or []), p.get("nationality"), p.get("register_date"),
+            p.get("last_active"), json.dumps(extra, ensure_ascii=False) if extra else None
+        ))
+        for m in u.get("memory_summaries") or []:
+            summaries.append((
+                uid, m.get("period"), m.get("summary"), m.get("created_at"), int(bool(m.get("revised_by_user"))),
+                m.get("revised_content"), m.get("revised_at")
+            ))
+        for r in u.get("reminders") or []:
+            reminders.append((
+                r.get("reminder_id"), uid, r.get("title"), r.get("description"), r.get("due_date"),
+                r.get("priority"), r.get("status"), r.get("created_at"), r.get("updated_at")
+            ))
+    conn = sqlite3.connect(db_path)
+    try:
+        ensure_time_columns(conn)
+        with conn:
+            conn.executemany(
+                """INSERT INTO users (id, name, age, gender, education, occupation, city, interests, language,
+                       nationality, register_date, last_active, extra_information)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(id) DO UPDATE SET
+                       name=excluded.name, age=excluded.age, gender=excluded.gender, education=excluded.education,
+                       occupation=excluded.occupation, city=excluded.city, interests=excluded.interests,
+                       language=excluded.language, nationality=excluded.nationality,
+                       register_date=COALESCE(excluded.register_date, users.register_date),
+                       last_active=COALESCE(excluded.last_active, users.last_active),
+                       extra_information=COALESCE(excluded.extra_information, users.extra_information)""",
+                users
+            )
+            # 已存在的摘要（同用户、同创建日期、同内容）不重复写入
+            conn.executemany(
+                """INSERT INTO memory_summaries (user_id, period, summary, created_at, revised_by_user, revised_content, revised_at)
+                   SELECT ?, ?, ?, ?, ?, ?, ?
+                   WHERE NOT EXISTS (SELECT 1 FROM memory_summaries WHERE user_id=?1 AND created_at=?4 AND summary=?3)""",
+                summaries
+            )
+            # due_date 可能变化，清空 due_ts，由随后的 backfill_time_columns 按新日期重算
+            conn.executemany(
+                """INSERT INTO reminders (id, user_id, title, description, due_date, priority, status, created_at, updated_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(id) DO UPDATE SET
+                       title=excluded.title, description=excluded.description, due_date=excluded.due_date,
+                       due_ts=NULL, priority=excluded.priority, status=excluded.status, updated_at=excluded.updated_at""",
+                reminders
+            )
+        backfill_time_columns(conn)
+    finally:
+        conn.close()
+    return _report("yaml2db", "users/memory_summaries/reminders", len(users) + len(summaries) + len(reminders),
+                   time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="数据库批量导入/导出工具")
+    parser.add_argument("--db", default=DATABASE_PATH, help="SQLite 数据库路径")
+    sub = parser.add_subparsers(dest="command", required=True)
+    exp = sub.add_parser("export", help="流式导出各表")
+    exp.add_argument("out_dir")
+    exp.add_argument("--format", choices=["jsonl", "csv"], default="jsonl")
+    exp.add_argument("--tables", nargs="*")
+    exp.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    imp = sub.add_parser("import", help="批量导入 <表名>.jsonl/.csv")
+    imp.add_argument("in_dir")
+    imp.add_argument("--format", choices=["jsonl", "csv"], default="jsonl")
+    imp.add_argument("--tables", nargs="*")
+    imp.add_argument("--keep-indexes", action="store_true", help="导入时不删除/重建索引")
+    imp.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    y2d = sub.add_parser("yaml2db", help="将 YAML 缓存合并进数据库")
+    y2d.add_argument("--yaml", default=str(MEMORY_PATH))
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export_database(args.db, args.out_dir, args.format, args.tables, args.chunk_size)
+    elif args.command == "import":
+        import_database(args.db, args.in_dir, args.format, args.tables, not args.keep_indexes, args.chunk_size)
+    else:
+        consolidate_yaml(args.db, args.yaml)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+多会话异步聊天服务：单进程内用 asyncio 承载大量并发用户会话（HTTP + SSE，仅依赖标准库）。
+- 会话池：每个 user_id 一个 MemoryAgent，按 LRU + 空闲超时淘汰，淘汰前保存未落盘的对话
+- 每用户并发限制：同一会话的请求串行执行，排队超过上限返回 429
+- LLM 调用走 acall_openai（请求合并 + 超时/重试/对冲），数据库操作放到线程池，不阻塞事件循环
+
+接口：
+    POST /sessions/{user_id}/ask        {"question": "..."}，Accept: text/event-stream 时以 SSE 返回
+    POST /sessions/{user_id}/new        开启新对话组
+    POST /sessions/{user_id}/switch     {"group_id": 3}
+    POST /sessions/{user_id}/save       保存当前对话
+    GET  /sessions/{user_id}/history?page=1
+    GET  /sessions/{user_id}/groups
+    GET  /stats
+
+用法：
+    python chat_server.py --host 127.0.0.1 --port 8765
+"""
+import argparse
+import asyncio
+import json
+import signal
+import time
+from collections import OrderedDict
+from functools import partial
+from urllib.parse import urlsplit, parse_qs
+from dotenv import load_dotenv
+from agents.memory_agent import MemoryAgent
+from config import DATABASE_PATH, CHAT_SERVER_HOST, CHAT_SERVER_PORT
+from utils.openai_api import get_coalesce_stats, get_resilience_stats
+
+SSE_KEEPALIVE = 15
+MAX_BODY = 1 << 20
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               413: "Payload Too Large", 429: "Too Many Requests", 500: "Internal Server Error",
+               504: "Gateway Timeout"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class Session:
+    __slots__ = ("user_id", "agent", "lock", "pending", "last_used")
+
+    def __init__(self, user_id, agent):
+        self.user_id = user_id
+        self.agent = agent
+        self.lock = asyncio.Lock()
+        self.pending = 0
+        self.last_used = time.monotonic()
+
+
+class SessionPool:
+    """
+    user_id -> Session 的 LRU 池。超过 max_sessions 或空闲超过 idle_timeout 的会话被淘汰：
+    从池中摘除后在后台保存并关闭（最多 flush_concurrency 个同时进行），不占用触发淘汰的请求。
+    正在处理请求的会话不会被淘汰。
+    """
+    def __init__(self, db_path=DATABASE_PATH, max_sessions=500, idle_timeout=900, max_pending_per_user=4,
+                 flush_concurrency=8):
+        self.db_path = db_path
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.max_pending_per_user = max_pending_per_user
+        self._sessions = OrderedDict()
+        self._creating = {}
+        self._closing = {}
+        self._flush_sem = asyncio.Semaphore(flush_concurrency)
+        self.stats = {"created": 0, "evicted_lru": 0, "evicted_idle": 0, "rejected": 0}
+
+    def _new_agent(self, user_id):
+        return MemoryAgent(user_id, db_path=self.db_path, register_signals=False)
+
+    async def _create(self, user_id):
+        try:
+            # 该用户的旧会话若正在淘汰保存，等保存完成后再载入，避免丢失最后几轮
+            closing = self._closing.get(user_id)
+            if closing is not None:
+                await asyncio.wait([closing])
+            agent = await asyncio.to_thread(self._new_agent, user_id)
+        finally:
+            self._creating.pop(user_id, None)
+        session = Session(user_id, agent)
+        # 为发起创建的请求预先占用，保证会话在其使用前不会被淘汰
+        session.pending = 1
+        self._sessions[user_id] = session
+        self.stats["created"] += 1
+        return session
+
+    async def _acquire(self, user_id):
+        while True:
+            session = self._sessions.get(user_id)
+            if session is not None:
+                if session.pending >= self.max_pending_per_user:
+                    self.stats["rejected"] += 1
+                    raise HTTPError(429, "too many concurrent requests for this user")
+                # pending 在任何 await 之前加一，保证会话不会在使用前被淘汰
+                session.pending += 1
+                self._sessions.move_to_end(user_id)
+                self._evict_lru()
+                return session
+            # 同一用户的并发首次请求只创建一个会话，其余请求等待创建完成后重新查找
+            task = self._creating.get(user_id)
+            if task is None:
+                task = self._creating[user_id] = asyncio.ensure_future(self._create(user_id))
+                try:
+                    # shield：发起创建的请求被取消时，创建仍会完成，等待同一会话的其他请求不受影响
+                    session = await asyncio.shield(task)
+                except asyncio.CancelledError:
+                    task.add_done_callback(self._release_cancelled_creator)
+                    raise
+                self._evict_lru()
+                return session
+            await asyncio.shield(task)
+
+    def _release_cancelled_creator(self, task):
+        # 释放 _create 为已取消的请求预占的 pending，否则该会话永远不会被淘汰
+        if task.cancelled() or task.exception() is not None:
+            return
+        session = task.result()
+        session.pending -= 1
+        session.last_used = time.monotonic()
+        self._evict_lru()
+
+    async def run(self, user_id, fn):
+        """
+        在该用户的会话上串行执行 fn(agent)（fn 可以是普通函数或返回协程的函数）。
+        """
+        session = await self._acquire(user_id)
+        try:
+            async with session.lock:
+                result = fn(session.agent)
+                if asyncio.iscoroutine(result):
+                    result = await result
+                return result
+        finally:
+            session.pending -= 1
+            session.last_used = time.monotonic()
+            # 超出容量时请求中的会话无法淘汰，空闲下来后再收缩
+            self._evict_lru()
+
+    async def _flush(self, session):
+        # 等待会话上正在进行的请求结束（淘汰的会话此时必然空闲），本轮回答也一并保存
+        async with self._flush_sem, session.lock:
+            await asyncio.to_thread(session.agent.close)
+
+    def _close(self, session):
+        """
+        在后台保存并关闭已从池中摘除的会话，返回任务；该用户再次建会话时会先等待它完成。
+        """
+        task = asyncio.ensure_future(self._flush(session))
+        self._closing[session.user_id] = task
+        task.add_done_callback(partial(self._on_closed, session.user_id))
+        return task
+
+    def _on_closed(self, user_id, task):
+        if self._closing.get(user_id) is task:
+            del self._closing[user_id]
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Failed to save session {user_id}: {task.exception()}")
+
+    def _evict_lru(self):
+        while len(self._sessions) > self.max_sessions:
+            victim = next((s for s in self._sessions.values() if s.pending == 0 and not s.lock.locked()), None)
+            if victim is None:
+                return
+            del self._sessions[victim.user_id]
+            self.stats["evicted_lru"] += 1
+            self._close(victim)
+
+    async def evict_idle(self):
+        deadline = time.monotonic() - self.idle_timeout
+        idle = [s for s in self._sessions.values() if s.last_used < deadline and s.pending == 0 and not s.lock.locked()]
+        for s in idle:
+            del self._sessions[s.user_id]
+            self.stats["evicted_idle"] += 1
+        await asyncio.gather(*[self._close(s) for s in idle], return_exceptions=True)
+
+    async def sweep_forever(self, interval=30):
+        while True:
+            await asyncio.sleep(interval)
+            await self.evict_idle()
+
+    async def close_all(self):
+        """
+        并发保存并关闭所有会话，并等待此前后台淘汰中的会话保存完成。
+        """
+        sessions, self._sessions = list(self._sessions.values()), OrderedDict()
+        for s in sessions:
+            self._close(s)
+        while self._closing:
+            await asyncio.gather(*self._closing.values(), return_exceptions=True)
+
+    def snapshot(self):
+        return dict(self.stats, active=len(self._sessions), closing=len(self._closing),
+                    busy=sum(1 for s in self._sessions.values() if s.pending))
+
+
+class ChatServer:
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def handle(self, reader, writer):
+        try:
+            method, path, query, headers, body = await self._read_request(reader)
+            await self._dispatch(writer, method, path, query, headers, body)
+        except HTTPError as e:
+            await self._send_json(writer, e.status, {"error": str(e)})
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except TimeoutError as e:
+            await self._send_json(writer, 504, {"error": str(e) or "upstream timeout"})
+        except Exception as e:
+            await self._send_json(writer, 500, {"error": str(e)})
+        finally:
+            try:
+                writer.close()
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+    async def _read_request(self, reader):
+        request_line = (await reader.readline()).decode("latin-1").strip()
+        if not request_line:
+            raise asyncio.IncompleteReadError(b"", None)
+        try:
+            method, target, _ = request_line.split(" ", 2)
+        except ValueError:
+            raise HTTPError(400, "malformed request line")
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1")
+            if line in ("\r\n", "\n", ""):
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length") or 0)
+        if length > MAX_BODY:
+            raise HTTPError(413, "request body too large")
+        body = await reader.readexactly(length) if length else b""
+        url = urlsplit(target)
+        return method.upper(), url.path, parse_qs(url.query), headers, body
+
+    async def _dispatch(self, writer, method, path, query, headers, body):
+        parts = [p for p in path.split("/") if p]
+        if parts == ["stats"] and method == "GET":
+            return await self._send_json(writer, 200, {
+                "sessions": self.pool.snapshot(),
+                "coalesce": get_coalesce_stats(),
+                "resilience": get_resilience_stats(),
+            })
+        if len(parts) != 3 or parts[0] != "sessions" or not parts[1].isdigit():
+            raise HTTPError(404, "not found")
+        user_id, action = int(parts[1]), parts[2]
+        payload = self._json_body(body)
+
+        if action == "ask" and method == "POST":
+            question = (payload.get("question") or "").strip()
+            if not question:
+                raise HTTPError(400, "question is required")
+            ask = self.pool.run(user_id, lambda agent: agent.aask(question))
+            if "text/event-stream" in headers.get("accept", ""):
+                return await self._stream_answer(writer, ask)
+            return await self._send_json(writer, 200, {"answer": await ask})
+        if action == "new" and method == "POST":
+            group_id = await self.pool.run(user_id, lambda agent: asyncio.to_thread(self._new_group, agent))
+            return await self._send_json(writer, 200, {"group_id": group_id})
+        if action == "switch" and method == "POST":
+            group_id = payload.get("group_id")
+            if not isinstance(group_id, int):
+                raise HTTPError(400, "group_id must be an integer")
+            await self.pool.run(user_id, lambda agent: asyncio.to_thread(agent.switch_conversation, group_id))
+            return await self._send_json(writer, 200, {"group_id": group_id})
+        if action == "save" and method == "POST":
+            await self.pool.run(user_id, lambda agent: asyncio.to_thread(agent.save))
+            return await self._send_json(writer, 200, {"saved": True})
+        if action == "history" and method == "GET":
+            page = int(query.get("page", ["1"])[0] or 1)
+            items, total_pages = await self.pool.run(user_id, lambda agent: agent.get_history(page))
+            return await self._send_json(writer, 200, {
+                "page": page, "total_pages": total_pages,
+                "messages": [{"index": i, "role": m.role, "content": m.content} for i, m in items],
+            })
+        if action == "groups" and method == "GET":
+            groups = await self.pool.run(user_id, lambda agent: asyncio.to_thread(agent.list_conversations))
+            return await self._send_json(writer, 200, {"groups": groups})
+        raise HTTPError(405 if action in ("ask", "new", "switch", "save", "history", "groups") else 404,
+                        f"unsupported: {method} {path}")
+
+    @staticmethod
+    def _new_group(agent):
+        agent.new_conversation()
+        return agent.group_id
+
+    @staticmethod
+    def _json_body(body):
+        if not body:
+            return {}
+        try:
+            data = json.loads(body)
+        except ValueError:
+            raise HTTPError(400, "invalid JSON body")
+        if not isinstance(data, dict):
+            raise HTTPError(400, "JSON body must be an object")
+        return data
+
+    async def _send_json(self, writer, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        writer.write(
+            f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: close\r\n\r\n".encode("latin-1") + body
+        )
+        await writer.drain()
+
+    async def _stream_answer(self, writer, ask):
+        """
+        SSE：先发送 status 事件，等待期间定期发送 keepalive 注释，最后发送 answer 或 error 事件。
+        """
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream; charset=utf-8\r\n"
+            b"Cache-Control: no-cache\r\nConnection: close\r\n\r\n"
+        )
+        await self._send_event(writer, "status", {"status": "thinking"})
+        task = asyncio.ensure_future(ask)
+        try:
+            while True:
+                try:
+                    answer = await asyncio.wait_for(asyncio.shield(task), SSE_KEEPALIVE)
+                    break
+                except asyncio.TimeoutError:
+                    if task.done():
+                        raise
+                    writer.write(b": keepalive\n\n")
+                    await writer.drain()
+        except ConnectionError:
+            # 客户端断开：请求仍会完成并保留在会话中
+            return
+        except HTTPError as e:
+            return await self._send_event(writer, "error", {"status": e.status, "error": str(e)})
+        except Exception as e:
+            return await self._send_event(writer, "error", {"status": 500, "error": str(e)})
+        await self._send_event(writer, "answer", {"answer": answer})
+
+    @staticmethod
+    async def _send_event(writer, event, data):
+        writer.write(f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8"))
+        await writer.drain()
+
+
+async def serve(host, port, pool):
+    """
+    运行服务直到收到 SIGTERM/SIGINT，然后停止接受连接并并发保存所有会话。
+    """
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:  # Windows 不支持，退回 KeyboardInterrupt
+            pass
+    server = ChatServer(pool)
+    sweeper = asyncio.ensure_future(pool.sweep_forever())
+    srv = await asyncio.start_server(server.handle, host, port, limit=MAX_BODY)
+    print(f"Chat server listening on http://{host}:{port}")
+    try:
+        await stop.wait()
+    finally:
+        sweeper.cancel()
+        srv.close()
+        print("Shutting down, saving all sessions...")
+        await pool.close_all()
+        print("Save complete.")
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="多会话异步聊天服务")
+    parser.add_argument("--host", default=CHAT_SERVER_HOST)
+    parser.add_argument("--port", type=int, default=CHAT_SERVER_PORT)
+    parser.add_argument("--max-sessions", type=int, default=500)
+    parser.add_argument("--idle-timeout", type=int, default=900, help="会话空闲多少秒后淘汰")
+    parser.add_argument("--max-pending", type=int, default=4, help="每个用户最多排队的请求数")
+    args = parser.parse_args()
+    pool = SessionPool(max_sessions=args.max_sessions, idle_timeout=args.idle_timeout,
+                       max_pending_per_user=args.max_pending)
+    try:
+        asyncio.run(serve(args.host, args.port, pool))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
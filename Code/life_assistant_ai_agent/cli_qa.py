@@ -20,8 +20,8 @@ def main():
     groups = agent.list_conversations()
     if not groups:
         print("[Info] No conversation history found for this user. Use /new to start a new conversation group.")
-    print("Type your question to start chatting. Commands: /new (new conversation), /switch (switch group), /history [page] (view history), /exit (exit), /summarize (summarize memory), /profile (manage user profile).\n")
-    allowed_cmds = ["/new", "/switch", "/history", "/exit", "/summarize", "/profile"]
+    print("Type your question to start chatting. Commands: /new (new conversation), /switch (switch group), /history [page] (view history), /exit (exit), /summarize (summarize memory), /profile (manage user profile), /refresh (update profile and memory summary in one pass).\n")
+    allowed_cmds = ["/new", "/switch", "/history", "/exit", "/summarize", "/profile", "/refresh"]
     while True:
         user_input = input("You: ")
         if user_input.strip() == "":
@@ -58,18 +58,38 @@ def main():
                 page = int(parts[1])
             agent.show_history(page)
         elif user_input.startswith("/summarize"):
-            agent.summarize_user_memory()
+            try:
+                agent.summarize_user_memory()
+            except Exception as e:
+                print(f"[Error] Memory summary failed: {e}")
+                continue
             print("Memory summary generated and saved to database and YAML.")
+        elif user_input.startswith("/refresh"):
+            try:
+                result = agent.refresh_profile_and_memory()
+            except Exception as e:
+                print(f"[Error] Refresh failed: {e}")
+                continue
+            if result:
+                print("User profile and memory summary updated and saved to database and YAML.")
         elif user_input.startswith("/profile"):
             mode = input("Choose mode: 1-Manual entry 2-Auto generate (default 2): ")
             if mode.strip() == "1":
                 agent.manual_profile_entry()
                 print("User profile manually entered and saved to database and YAML.")
             else:
-                agent.auto_generate_profile()
+                try:
+                    agent.auto_generate_profile()
+                except Exception as e:
+                    print(f"[Error] Profile generation failed: {e}")
+                    continue
                 print("User profile auto-generated and saved to database and YAML.")
         else:
-            answer = agent.ask(user_input)
+            try:
+                answer = agent.ask(user_input)
+            except Exception as e:
+                print(f"[Error] Request failed: {e}. Your conversation is kept, please try again.")
+                continue
             print("AI:", answer)
 
 if __name__ == "__main__":
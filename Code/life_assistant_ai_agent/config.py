@@ -8,4 +8,9 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATABASE_PATH = os.path.join(BASE_DIR, "data", "reminders.db")
 
 # # 优先从环境变量读取 API Key
-# OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
\ No newline at end of file
+# OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+
+# 多会话聊天服务（chat_server.py），Streamlit 作为客户端通过 HTTP 访问
+CHAT_SERVER_HOST = os.getenv("CHAT_SERVER_HOST", "127.0.0.1")
+CHAT_SERVER_PORT = int(os.getenv("CHAT_SERVER_PORT", "8765"))
+CHAT_SERVER_URL = os.getenv("CHAT_SERVER_URL", f"http://{CHAT_SERVER_HOST}:{CHAT_SERVER_PORT}")
@@ -11,7 +11,8 @@ CREATE TABLE IF NOT EXISTS users (
     language TEXT,  -- 逗号分隔
     nationality TEXT,
     register_date TEXT,
-    last_active TEXT
+    last_active TEXT,
+    extra_information TEXT -- JSON，主字段以外的画像信息
 );
 
 -- 对话历史表（热数据）
@@ -22,6 +23,7 @@ CREATE TABLE IF NOT EXISTS conversations (
     role TEXT,        -- user/assistant
     content TEXT,
     timestamp TEXT,
+    timestamp_ts INTEGER, -- timestamp 的 epoch 秒，用于时间窗口查询
     tags TEXT,
     FOREIGN KEY(user_id) REFERENCES users(id)
 );
@@ -46,9 +48,44 @@ CREATE TABLE IF NOT EXISTS reminders (
     title TEXT,
     description TEXT,
     due_date TEXT,
+    due_ts INTEGER, -- due_date 的 epoch 秒，用于时间窗口查询
     priority TEXT, -- 高/中/低
     status TEXT,   -- 待办/已完成
     created_at TEXT,
     updated_at TEXT,
     FOREIGN KEY(user_id) REFERENCES users(id)
-); 
\ No newline at end of file
+);
+
+-- 时间窗口查询索引（已有数据库由 utils/db_utils.ensure_time_columns 迁移）
+CREATE INDEX IF NOT EXISTS idx_reminders_user_status_due ON reminders (user_id, status, due_ts);
+CREATE INDEX IF NOT EXISTS idx_conversations_user_ts ON conversations (user_id, timestamp_ts);
+CREATE INDEX IF NOT EXISTS idx_reminders_due_ts_null ON reminders (id) WHERE due_ts IS NULL;
+CREATE INDEX IF NOT EXISTS idx_conversations_ts_null ON conversations (id) WHERE timestamp_ts IS NULL;
+
+-- 时间列同步触发器：due_date / timestamp 写入或修改时重算 epoch 列（SQLite 无法解析的格式置 NULL，由 to_epoch 回填）
+CREATE TRIGGER IF NOT EXISTS trg_reminders_due_ts_insert AFTER INSERT ON reminders
+WHEN NEW.due_ts IS NULL AND NEW.due_date IS NOT NULL
+BEGIN
+    UPDATE reminders SET due_ts = CASE WHEN NEW.due_date GLOB '[0-9][0-9][0-9][0-9][-/][0-9][0-9][-/][0-9][0-9]*'
+          AND date(julianday(replace(NEW.due_date, '/', '-'))) = substr(replace(NEW.due_date, '/', '-'), 1, 10)
+        THEN CAST(strftime('%s', replace(NEW.due_date, '/', '-'), 'utc') AS INTEGER) END WHERE id = NEW.id;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_reminders_due_ts_update AFTER UPDATE OF due_date ON reminders
+BEGIN
+    UPDATE reminders SET due_ts = CASE WHEN NEW.due_date GLOB '[0-9][0-9][0-9][0-9][-/][0-9][0-9][-/][0-9][0-9]*'
+          AND date(julianday(replace(NEW.due_date, '/', '-'))) = substr(replace(NEW.due_date, '/', '-'), 1, 10)
+        THEN CAST(strftime('%s', replace(NEW.due_date, '/', '-'), 'utc') AS INTEGER) END WHERE id = NEW.id;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_conversations_timestamp_ts_insert AFTER INSERT ON conversations
+WHEN NEW.timestamp_ts IS NULL AND NEW.timestamp IS NOT NULL
+BEGIN
+    UPDATE conversations SET timestamp_ts = CASE WHEN NEW.timestamp GLOB '[0-9][0-9][0-9][0-9][-/][0-9][0-9][-/][0-9][0-9]*'
+          AND date(julianday(replace(NEW.timestamp, '/', '-'))) = substr(replace(NEW.timestamp, '/', '-'), 1, 10)
+        THEN CAST(strftime('%s', replace(NEW.timestamp, '/', '-'), 'utc') AS INTEGER) END WHERE id = NEW.id;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_conversations_timestamp_ts_update AFTER UPDATE OF timestamp ON conversations
+BEGIN
+    UPDATE conversations SET timestamp_ts = CASE WHEN NEW.timestamp GLOB '[0-9][0-9][0-9][0-9][-/][0-9][0-9][-/][0-9][0-9]*'
+          AND date(julianday(replace(NEW.timestamp, '/', '-'))) = substr(replace(NEW.timestamp, '/', '-'), 1, 10)
+        THEN CAST(strftime('%s', replace(NEW.timestamp, '/', '-'), 'utc') AS INTEGER) END WHERE id = NEW.id;
+END;
@@ -0,0 +1,111 @@
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+import yaml
+from bulk_io import export_database, import_database, consolidate_yaml
+from utils.time_utils import to_epoch
+
+SCHEMA = Path(__file__).parent.parent / "data" / "init_db.sql"
+
+
+def make_db(path, n_rows=0):
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA.read_text(encoding="utf-8"))
+    conn.executemany(
+        "INSERT INTO conversations (user_id, group_id, role, content, timestamp, tags) VALUES (?, ?, ?, ?, ?, ?)",
+        [(1, i // 10, "user", f"消息 {i}", "2024-06-01 10:00:00", "") for i in range(n_rows)]
+    )
+    conn.commit()
+    conn.close()
+
+
+class TestBulkIO(unittest.TestCase):
+    def test_roundtrip_restores_rows_and_indexes(self):
+        for fmt in ("jsonl", "csv"):
+            with tempfile.TemporaryDirectory() as tmp:
+                src, dst = Path(tmp) / "src.db", Path(tmp) / "dst.db"
+                make_db(src, n_rows=250)
+                make_db(dst)
+                export_database(src, Path(tmp) / "dump", fmt, chunk_size=100)
+                stats = import_database(dst, Path(tmp) / "dump", fmt, chunk_size=100)
+                self.assertEqual({s["table"]: s["rows"] for s in stats}["conversations"], 250)
+                conn = sqlite3.connect(dst)
+                rows = conn.execute("SELECT id, content, timestamp_ts FROM conversations ORDER BY id").fetchall()
+                indexes = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+                conn.close()
+                self.assertEqual(len(rows), 250)
+                self.assertEqual(rows[7][1], "消息 7")
+                self.assertIsNotNone(rows[0][2])
+                self.assertIn("idx_conversations_user_ts", indexes)
+
+    def test_failed_import_rolls_back(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            src, dst = Path(tmp) / "src.db", Path(tmp) / "dst.db"
+            make_db(src, n_rows=5)
+            make_db(dst, n_rows=5)  # 主键冲突
+            export_database(src, Path(tmp) / "dump", tables=["conversations"])
+            with self.assertRaises(sqlite3.IntegrityError):
+                import_database(dst, Path(tmp) / "dump")
+            conn = sqlite3.connect(dst)
+            count = conn.execute("SELECT COUNT(*) FROM conversations").fetchone()[0]
+            indexes = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+            conn.close()
+            self.assertEqual(count, 5)
+            self.assertIn("idx_conversations_user_ts", indexes)
+
+    def test_failed_table_rolls_back_whole_directory(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            src, dst = Path(tmp) / "src.db", Path(tmp) / "dst.db"
+            make_db(src, n_rows=5)
+            make_db(dst)
+            conn = sqlite3.connect(src)
+            conn.execute("INSERT INTO users (id, name) VALUES (1, 'a')")
+            conn.commit()
+            conn.close()
+            export_database(src, Path(tmp) / "dump", tables=["users", "conversations"])
+            # users 先导入成功，conversations 因表不存在而失败
+            conn = sqlite3.connect(dst)
+            conn.execute("DROP TABLE conversations")
+            conn.close()
+            with self.assertRaises(sqlite3.OperationalError):
+                import_database(dst, Path(tmp) / "dump")
+            conn = sqlite3.connect(dst)
+            users = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+            conn.close()
+            self.assertEqual(users, 0)
+
+    def test_yaml2db_recomputes_due_ts_when_due_date_changes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            db, yaml_path = Path(tmp) / "db.db", Path(tmp) / "memory.yaml"
+            make_db(db)
+            reminder = {"reminder_id": 1, "title": "续签", "due_date": "2024-06-10", "status": "待办"}
+            data = {"users": [{"user_profile": {"user_id": 1, "name": "a"}, "reminders": [reminder]}]}
+            for due in ("2024-06-10", "2030年1月1日"):
+                reminder["due_date"] = due
+                yaml_path.write_text(yaml.safe_dump(data, allow_unicode=True), encoding="utf-8")
+                consolidate_yaml(db, yaml_path)
+                conn = sqlite3.connect(db)
+                due_ts = conn.execute("SELECT due_ts FROM reminders WHERE id=1").fetchone()[0]
+                conn.close()
+                self.assertEqual(due_ts, to_epoch(due))
+
+    def test_yaml2db_adds_missing_extra_information_column(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            db, yaml_path = Path(tmp) / "db.db", Path(tmp) / "memory.yaml"
+            make_db(db)
+            conn = sqlite3.connect(db)
+            conn.execute("ALTER TABLE users DROP COLUMN extra_information")  # 旧版数据库
+            conn.close()
+            profile = {"user_id": 1, "name": "a", "extra_information": {"Common Apps": ["Line"]}}
+            yaml_path.write_text(yaml.safe_dump({"users": [{"user_profile": profile}]}, allow_unicode=True),
+                                 encoding="utf-8")
+            consolidate_yaml(db, yaml_path)
+            conn = sqlite3.connect(db)
+            extra = conn.execute("SELECT extra_information FROM users WHERE id=1").fetchone()[0]
+            conn.close()
+            self.assertEqual(extra, '{"Common Apps": ["Line"]}')
+
+
+if __name__ == "__main__":
+    unittest.main()
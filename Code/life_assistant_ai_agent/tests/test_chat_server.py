@@ -0,0 +1,178 @@
+import asyncio
+import json
+import os
+import signal
+import sqlite3
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+import agents.memory_agent as memory_agent
+from chat_server import ChatServer, SessionPool, HTTPError, serve
+
+SCHEMA = Path(__file__).parent.parent / "data" / "init_db.sql"
+BASE_USER = 5000  # 不在 user_memory.yaml 中，测试不会改写 YAML
+
+
+async def fake_llm(messages, call_site="default"):
+    await asyncio.sleep(0.05)
+    return f"echo: {messages[-1].content}"
+
+
+class TestChatServer(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = str(Path(self.tmp.name) / "test.db")
+        conn = sqlite3.connect(self.db_path)
+        conn.executescript(SCHEMA.read_text(encoding="utf-8"))
+        conn.close()
+        patcher = mock.patch.object(memory_agent, "acall_openai", fake_llm)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def saved_rows(self, user_id):
+        conn = sqlite3.connect(self.db_path)
+        rows = conn.execute("SELECT role, content FROM conversations WHERE user_id=? ORDER BY id", (user_id,)).fetchall()
+        conn.close()
+        return rows
+
+    def test_many_sessions_and_lru_eviction_flushes(self):
+        async def run():
+            pool = SessionPool(db_path=self.db_path, max_sessions=3)
+            answers = await asyncio.gather(*[
+                pool.run(BASE_USER + i, lambda agent, i=i: agent.aask(f"q{i}")) for i in range(10)
+            ])
+            snapshot = pool.snapshot()
+            await pool.close_all()
+            return answers, snapshot
+
+        answers, snapshot = asyncio.run(run())
+        self.assertEqual(answers, [f"echo: q{i}" for i in range(10)])
+        self.assertLessEqual(snapshot["active"], 3)
+        self.assertEqual(snapshot["created"], 10)
+        self.assertEqual(snapshot["evicted_lru"] + snapshot["active"], 10)
+        for i in range(10):
+            self.assertEqual(self.saved_rows(BASE_USER + i), [("user", f"q{i}"), ("assistant", f"echo: q{i}")])
+
+    def test_eviction_flush_does_not_block_requests(self):
+        close = memory_agent.MemoryAgent.close
+
+        def slow_close(agent):
+            time.sleep(0.5)
+            close(agent)
+
+        async def run():
+            pool = SessionPool(db_path=self.db_path, max_sessions=1)
+            await pool.run(BASE_USER, lambda agent: agent.aask("a"))
+            start = time.monotonic()
+            await pool.run(BASE_USER + 1, lambda agent: agent.aask("b"))  # 淘汰 BASE_USER
+            elapsed = time.monotonic() - start
+            closing = pool.snapshot()["closing"]
+            await pool.close_all()
+            return elapsed, closing
+
+        with mock.patch.object(memory_agent.MemoryAgent, "close", slow_close):
+            elapsed, closing = asyncio.run(run())
+        self.assertLess(elapsed, 0.4)
+        self.assertEqual(closing, 1)
+        self.assertEqual(self.saved_rows(BASE_USER), [("user", "a"), ("assistant", "echo: a")])
+
+    def test_per_user_requests_are_serialized_and_limited(self):
+        async def run():
+            pool = SessionPool(db_path=self.db_path, max_pending_per_user=2)
+            results = await asyncio.gather(*[
+                pool.run(BASE_USER, lambda agent, n=n: agent.aask(f"m{n}")) for n in range(3)
+            ], return_exceptions=True)
+            history, _ = await pool.run(BASE_USER, lambda agent: agent.get_history(1))
+            await pool.close_all()
+            return results, history, pool.stats
+
+        results, history, stats = asyncio.run(run())
+        self.assertEqual(results[:2], ["echo: m0", "echo: m1"])
+        self.assertIsInstance(results[2], HTTPError)
+        self.assertEqual(results[2].status, 429)
+        self.assertEqual(stats["rejected"], 1)
+        self.assertEqual([m.content for _, m in history], ["m0", "echo: m0", "m1", "echo: m1"])
+
+    def test_http_ask_and_sse(self):
+        async def request(port, raw):
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(raw)
+            await writer.drain()
+            data = await reader.read()
+            writer.close()
+            return data.decode("utf-8")
+
+        async def run():
+            pool = SessionPool(db_path=self.db_path)
+            server = await asyncio.start_server(ChatServer(pool).handle, "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            body = json.dumps({"question": "你好"}).encode("utf-8")
+            head = f"POST /sessions/{BASE_USER}/ask HTTP/1.1\r\nContent-Length: {len(body)}\r\n"
+            plain = await request(port, (head + "\r\n").encode() + body)
+            sse = await request(port, (head + "Accept: text/event-stream\r\n\r\n").encode() + body)
+            missing = await request(port, b"GET /nope HTTP/1.1\r\n\r\n")
+            server.close()
+            await server.wait_closed()
+            await pool.close_all()
+            return plain, sse, missing
+
+        plain, sse, missing = asyncio.run(run())
+        self.assertTrue(plain.startswith("HTTP/1.1 200"))
+        self.assertEqual(json.loads(plain.split("\r\n\r\n", 1)[1]), {"answer": "echo: 你好"})
+        self.assertIn("event: status", sse)
+        self.assertIn('event: answer\ndata: {"answer": "echo: 你好"}', sse)
+        self.assertTrue(missing.startswith("HTTP/1.1 404"))
+
+    def test_sigterm_saves_sessions(self):
+        async def run():
+            pool = SessionPool(db_path=self.db_path)
+            server = asyncio.ensure_future(serve("127.0.0.1", 0, pool))
+            await asyncio.sleep(0.05)  # 等待 serve 安装信号处理
+            await asyncio.gather(*[
+                pool.run(BASE_USER + i, lambda agent, i=i: agent.aask(f"q{i}")) for i in range(3)
+            ])
+            os.kill(os.getpid(), signal.SIGTERM)
+            await asyncio.wait_for(server, 5)
+
+        with mock.patch("builtins.print"):
+            asyncio.run(run())
+        for i in range(3):
+            self.assertEqual(self.saved_rows(BASE_USER + i), [("user", f"q{i}"), ("assistant", f"echo: q{i}")])
+
+    def test_cancelled_requests_leave_no_trace(self):
+        async def run():
+            pool = SessionPool(db_path=self.db_path, max_sessions=1)
+            new_agent = pool._new_agent
+            pool._new_agent = lambda user_id: (time.sleep(0.2), new_agent(user_id))[1]
+            # 创建会话期间取消：预占的 pending 被释放，会话之后可被淘汰
+            creator = asyncio.ensure_future(pool.run(BASE_USER, lambda agent: agent.aask("never")))
+            await asyncio.sleep(0.05)
+            creator.cancel()
+            await asyncio.sleep(0.3)
+            after_create = pool.snapshot()
+            pool._new_agent = new_agent
+            # 等待回答期间取消：未回答的提问从历史中撤回
+            asker = asyncio.ensure_future(pool.run(BASE_USER, lambda agent: agent.aask("cancelled")))
+            await asyncio.sleep(0.02)
+            asker.cancel()
+            await asyncio.gather(creator, asker, return_exceptions=True)
+            history, _ = await pool.run(BASE_USER, lambda agent: agent.get_history(1))
+            await pool.run(BASE_USER + 1, lambda agent: agent.aask("b"))
+            snapshot = pool.snapshot()
+            await pool.close_all()
+            return after_create, history, snapshot
+
+        after_create, history, snapshot = asyncio.run(run())
+        self.assertEqual((after_create["created"], after_create["active"], after_create["busy"]), (1, 1, 0))
+        self.assertEqual(history, [])
+        self.assertEqual(snapshot["evicted_lru"], 1)
+        self.assertEqual(self.saved_rows(BASE_USER), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import time
+import unittest
+from datetime import date
+from agents.life_agent import LifeAgent, LocalInfoProvider
+from utils.api_utils import get_holiday
+
+
+class StubProvider(LocalInfoProvider):
+    def __init__(self, name, value, delay=0.0, timeout=0.5):
+        self.name = name
+        self.value = value
+        self.delay = delay
+        self.timeout = timeout
+        self.calls = 0
+
+    def fetch(self, location, day):
+        self.calls += 1
+        time.sleep(self.delay)
+        return self.value
+
+
+class TestLifeAgent(unittest.TestCase):
+    def test_slow_provider_returns_partial_result(self):
+        fast = StubProvider("weather", {"description": "晴"}, delay=0.05)
+        slow = StubProvider("events", ["花火大会"], delay=1.0, timeout=0.2)
+        agent = LifeAgent(providers=[fast, slow])
+        start = time.monotonic()
+        info = agent.fetch_local_info("Tokyo", date(2024, 7, 20))
+        elapsed = time.monotonic() - start
+        agent.close()
+        self.assertEqual(info["weather"], {"description": "晴"})
+        self.assertNotIn("events", info)
+        self.assertEqual(info["missing"], {"events": "timeout"})
+        self.assertLess(elapsed, 0.6)
+
+    def test_results_are_cached_per_location_and_date(self):
+        p = StubProvider("holiday", "海の日")
+        agent = LifeAgent(providers=[p])
+        agent.fetch_local_info("Tokyo", "2024-07-15")
+        info = agent.fetch_local_info("Tokyo", "2024-07-15")
+        agent.fetch_local_info("Osaka", "2024-07-15")
+        agent.close()
+        self.assertEqual(info["holiday"], "海の日")
+        self.assertEqual(p.calls, 2)
+
+    def test_offline_holiday_table(self):
+        self.assertEqual(get_holiday("2024-05-06"), "振替休日")
+        self.assertEqual(get_holiday(date(2026, 9, 22)), "国民の休日")
+        self.assertIsNone(get_holiday("2024-06-10"))
+        self.assertIsNone(get_holiday("2024-01-01", country="US"))
+        # 超出现行规则适用范围的年份不给出可能错误的结果
+        self.assertIsNone(get_holiday("2019-02-23"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import json
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+import yaml
+import agents.memory_agent as memory_agent
+from utils.user_profile_utils import parse_combined_extraction_from_llm
+
+SCHEMA = Path(__file__).parent.parent / "data" / "init_db.sql"
+USER_ID = 4242  # 不在 user_memory.yaml 中，测试不会改写 YAML
+
+LLM_OUTPUT = json.dumps({
+    "profile": {"name": "王五", "age": 25, "city": "东京", "interests": ["登山"], "Common Apps": ["Line"]},
+    "memory_summary": {"Main Concerns": "签证续签", "Interests": "登山"},
+}, ensure_ascii=False)
+
+
+class TestRefreshProfileAndMemory(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = str(Path(self.tmp.name) / "test.db")
+        conn = sqlite3.connect(self.db_path)
+        conn.executescript(SCHEMA.read_text(encoding="utf-8"))
+        conn.execute("INSERT INTO users (id, name) VALUES (?, ?)", (USER_ID, "Unknown"))
+        conn.execute(
+            "INSERT INTO conversations (user_id, group_id, role, content, timestamp) VALUES (?, 1, 'user', ?, '2024-06-01 10:00:00')",
+            (USER_ID, "我的在留卡快到期了")
+        )
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_single_llm_call_updates_profile_and_summary(self):
+        with mock.patch("signal.signal"), mock.patch.object(memory_agent, "call_openai", return_value=LLM_OUTPUT) as llm:
+            agent = memory_agent.MemoryAgent(USER_ID, db_path=self.db_path)
+            profile, summary = agent.refresh_profile_and_memory()
+            agent.conn.close()
+        self.assertEqual(llm.call_count, 1)
+        self.assertIn("我的在留卡快到期了", llm.call_args[0][0])
+        self.assertEqual(profile["extra_information"], {"Common Apps": ["Line"]})
+        self.assertEqual(summary["Main Concerns"], "签证续签")
+        conn = sqlite3.connect(self.db_path)
+        user = conn.execute("SELECT name, age, city, interests FROM users WHERE id=?", (USER_ID,)).fetchone()
+        stored = conn.execute("SELECT summary FROM memory_summaries WHERE user_id=?", (USER_ID,)).fetchall()
+        conn.close()
+        self.assertEqual(user, ("王五", 25, "东京", "登山"))
+        self.assertEqual(len(stored), 1)
+        self.assertEqual(json.loads(stored[0][0])["Interests"], "登山")
+
+    def test_null_fields_keep_existing_yaml_profile(self):
+        yaml_path = Path(self.tmp.name) / "user_memory.yaml"
+        profile = {"user_id": USER_ID, "name": "王五", "interests": ["摄影"], "language": ["中文"]}
+        yaml_path.write_text(yaml.safe_dump({"users": [{"user_profile": profile}]}, allow_unicode=True), encoding="utf-8")
+        llm_output = json.dumps({
+            "profile": {"name": "NULL", "interests": "NULL", "language": "NULL", "city": "东京"},
+            "memory_summary": {"Main Concerns": "签证续签"},
+        }, ensure_ascii=False)
+        with mock.patch("signal.signal"), mock.patch.object(memory_agent, "MEMORY_PATH", yaml_path), \
+                mock.patch.object(memory_agent, "call_openai", return_value=llm_output):
+            agent = memory_agent.MemoryAgent(USER_ID, db_path=self.db_path)
+            agent.refresh_profile_and_memory()
+            agent.conn.close()
+            # 刷新后仍可正常构造
+            memory_agent.MemoryAgent(USER_ID, db_path=self.db_path).conn.close()
+        self.assertIn("Interests: 摄影", agent.user_profile)
+        stored = yaml.safe_load(yaml_path.read_text(encoding="utf-8"))["users"][0]["user_profile"]
+        self.assertEqual((stored["name"], stored["interests"], stored["language"], stored["city"]),
+                         ("王五", ["摄影"], ["中文"], "东京"))
+        conn = sqlite3.connect(self.db_path)
+        user = conn.execute("SELECT name, interests, language, city FROM users WHERE id=?", (USER_ID,)).fetchone()
+        conn.close()
+        self.assertEqual(user, ("王五", "摄影", "中文", "东京"))
+
+    def test_parse_combined_output_with_code_block(self):
+        profile, summary = parse_combined_extraction_from_llm(f"```json\n{LLM_OUTPUT}\n```")
+        self.assertEqual(profile["name"], "王五")
+        self.assertEqual(summary["Interests"], "登山")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+import unittest
+from utils.messages import Message, MessageHistory
+
+
+class TestMessageHistory(unittest.TestCase):
+    def test_payload_is_converted_incrementally(self):
+        history = MessageHistory([Message("system", "sys", preamble=True), Message("user", "hi")])
+        first = history.sdk_payload()
+        cached = first[1]
+        history.append(Message("assistant", "hello"))
+        payload = history.sdk_payload()
+        self.assertIs(payload[1], cached)
+        self.assertEqual(payload[2], {"role": "assistant", "content": [{"type": "text", "text": "hello"}]})
+
+    def test_roles_are_interned_and_preamble_filtered(self):
+        history = MessageHistory()
+        history.append(Message("user", "[User Profile] x", preamble=True))
+        history.append(Message("".join(["us", "er"]), "question"))
+        history.append({"role": "assistant", "content": "answer"})
+        self.assertIs(history[0].role, history[1].role)
+        self.assertEqual([m.content for m in history.chat_messages()], ["question", "answer"])
+        self.assertEqual(history[2]["role"], "assistant")
+
+    def test_digest_tracks_content_and_pop(self):
+        a = MessageHistory([Message("user", "q")])
+        b = MessageHistory([Message("user", "q")])
+        self.assertEqual(a.digest(), b.digest())
+        before = a.digest()
+        a.sdk_payload()
+        a.append(Message("assistant", "r"))
+        a.sdk_payload()
+        self.assertNotEqual(a.digest(), before)
+        a.pop()
+        self.assertEqual(a.digest(), before)
+        self.assertEqual(len(a.sdk_payload()), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,143 @@
+import asyncio
+import time
+import unittest
+from utils.resilience import (
+    ResiliencePolicy, DeadlineExceeded, call_with_resilience, acall_with_resilience, retry_after_seconds
+)
+
+
+class FakeResponse:
+    def __init__(self, headers):
+        self.headers = headers
+
+
+class FakeStatusError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = FakeResponse(headers or {})
+
+
+class TestResilience(unittest.TestCase):
+    def test_retries_then_succeeds_and_honors_retry_after(self):
+        policy = ResiliencePolicy(deadline=5, max_retries=3, base_delay=0.01)
+        calls = []
+
+        def attempt(timeout, token):
+            calls.append(timeout)
+            if len(calls) == 1:
+                raise FakeStatusError(429, {"retry-after": "0.05"})
+            if len(calls) == 2:
+                raise FakeStatusError(503)
+            return "ok"
+
+        self.assertEqual(call_with_resilience(attempt, policy), "ok")
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(policy.stats["retries"], 2)
+        self.assertEqual(policy.stats["retry_after_honored"], 1)
+
+    def test_non_retryable_error_is_raised_immediately(self):
+        policy = ResiliencePolicy(deadline=5, max_retries=3)
+
+        def attempt(timeout, token):
+            raise FakeStatusError(400)
+
+        with self.assertRaises(FakeStatusError):
+            call_with_resilience(attempt, policy)
+        self.assertEqual(policy.stats["retries"], 0)
+        self.assertEqual(policy.stats["failures"], 1)
+
+    def test_stalled_attempt_is_retried_within_deadline(self):
+        policy = ResiliencePolicy(deadline=2, max_retries=3, base_delay=0.01, attempt_timeout=0.1)
+        calls = []
+
+        def attempt(timeout, token):
+            # 与 HTTP 客户端一样遵守本次尝试的超时
+            calls.append(timeout)
+            if len(calls) == 1:
+                time.sleep(timeout)
+                raise TimeoutError("stalled")
+            return "ok"
+
+        start = time.monotonic()
+        self.assertEqual(call_with_resilience(attempt, policy), "ok")
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertLessEqual(calls[0], 0.1)
+        self.assertEqual(policy.stats["retries"], 1)
+
+    def test_deadline_bounds_stalled_call(self):
+        policy = ResiliencePolicy(deadline=0.3, max_retries=10, base_delay=0.01, attempt_timeout=0.1)
+
+        def attempt(timeout, token):
+            time.sleep(timeout)
+            raise TimeoutError("stalled")
+
+        start = time.monotonic()
+        with self.assertRaises(DeadlineExceeded):
+            call_with_resilience(attempt, policy)
+        self.assertLess(time.monotonic() - start, 0.6)
+        self.assertEqual(policy.stats["deadline_exceeded"], 1)
+
+    def test_hedged_stall_is_bounded_and_cancelled(self):
+        policy = ResiliencePolicy(deadline=0.2, max_retries=2, hedge=True, hedge_after=1)
+        cancelled = []
+
+        def attempt(timeout, token):
+            token.on_cancel(lambda: cancelled.append(True))
+            time.sleep(1)
+            return "late"
+
+        start = time.monotonic()
+        with self.assertRaises(DeadlineExceeded):
+            call_with_resilience(attempt, policy)
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertTrue(cancelled)
+
+    def test_hedge_wins_and_loser_is_cancelled(self):
+        policy = ResiliencePolicy(deadline=2, hedge=True, hedge_after=0.05)
+        calls, cancelled = [], []
+
+        def attempt(timeout, token):
+            calls.append(1)
+            if len(calls) == 1:
+                token.on_cancel(lambda: cancelled.append(True))
+                time.sleep(0.5)
+                return "slow"
+            return "fast"
+
+        self.assertEqual(call_with_resilience(attempt, policy), "fast")
+        self.assertEqual(policy.stats["hedges"], 1)
+        self.assertEqual(policy.stats["hedge_wins"], 1)
+        self.assertTrue(cancelled)
+
+    def test_async_hedge_cancels_loser(self):
+        policy = ResiliencePolicy(deadline=2, hedge=True, hedge_after=0.05)
+        state = {"calls": 0, "cancelled": False}
+
+        async def attempt(timeout, token):
+            state["calls"] += 1
+            if state["calls"] == 1:
+                try:
+                    await asyncio.sleep(1)
+                except asyncio.CancelledError:
+                    state["cancelled"] = True
+                    raise
+                return "slow"
+            return "fast"
+
+        async def run():
+            result = await acall_with_resilience(attempt, policy)
+            await asyncio.sleep(0)
+            return result
+
+        self.assertEqual(asyncio.run(run()), "fast")
+        self.assertTrue(state["cancelled"])
+
+    def test_retry_after_parsing(self):
+        self.assertEqual(retry_after_seconds(FakeStatusError(429, {"retry-after-ms": "250"})), 0.25)
+        self.assertEqual(retry_after_seconds(FakeStatusError(429, {"retry-after": "3"})), 3.0)
+        self.assertIsNone(retry_after_seconds(FakeStatusError(500)))
+
+
+if __name__ == "__main__":
+    unittest.main()
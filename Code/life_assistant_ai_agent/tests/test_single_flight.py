@@ -0,0 +1,122 @@
+import asyncio
+import threading
+import time
+import unittest
+from unittest import mock
+import utils.openai_api as openai_api
+from utils.single_flight import SingleFlight, AsyncSingleFlight, make_key
+
+
+class TestSingleFlight(unittest.TestCase):
+    def test_make_key_is_order_independent(self):
+        self.assertEqual(make_key({"a": 1, "b": 2}), make_key({"b": 2, "a": 1}))
+        self.assertNotEqual(make_key("x"), make_key("y"))
+
+    def test_concurrent_calls_share_one_execution(self):
+        sf = SingleFlight()
+        calls = []
+
+        def slow():
+            calls.append(1)
+            time.sleep(0.1)
+            return "answer"
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(sf.do("k", slow))) for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(results, ["answer"] * 5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sf.stats["executed"], 1)
+        self.assertEqual(sf.stats["coalesced"], 4)
+        self.assertEqual(sf.in_flight(), 0)
+
+    def test_error_is_shared_and_key_released(self):
+        sf = SingleFlight()
+
+        def boom():
+            raise ValueError("upstream")
+
+        with self.assertRaises(ValueError):
+            sf.do("k", boom)
+        self.assertEqual(sf.do("k", lambda: "ok"), "ok")
+
+    def test_async_calls_share_one_execution(self):
+        sf = AsyncSingleFlight()
+        calls = []
+
+        async def slow():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "answer"
+
+        async def run():
+            return await asyncio.gather(*[sf.do("k", slow) for _ in range(5)])
+
+        self.assertEqual(asyncio.run(run()), ["answer"] * 5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sf.stats["coalesced"], 4)
+
+    def test_async_leader_cancellation_does_not_fail_followers(self):
+        sf = AsyncSingleFlight()
+
+        async def slow():
+            await asyncio.sleep(0.05)
+            return "answer"
+
+        async def run():
+            leader = asyncio.ensure_future(sf.do("k", slow))
+            await asyncio.sleep(0)
+            followers = [asyncio.ensure_future(sf.do("k", slow)) for _ in range(2)]
+            await asyncio.sleep(0)
+            leader.cancel()
+            return await asyncio.gather(*followers), leader.cancelled()
+
+        self.assertEqual(asyncio.run(run()), (["answer", "answer"], True))
+        self.assertEqual(sf.in_flight(), 0)
+
+    def test_async_upstream_cancelled_when_all_callers_cancel(self):
+        sf = AsyncSingleFlight()
+        state = {"cancelled": False}
+
+        async def slow():
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                state["cancelled"] = True
+                raise
+
+        async def run():
+            callers = [asyncio.ensure_future(sf.do("k", slow)) for _ in range(2)]
+            await asyncio.sleep(0.01)
+            for c in callers:
+                c.cancel()
+            await asyncio.gather(*callers, return_exceptions=True)
+            await asyncio.sleep(0)
+
+        asyncio.run(run())
+        self.assertTrue(state["cancelled"])
+        self.assertEqual(sf.in_flight(), 0)
+
+    def test_different_call_sites_are_not_coalesced(self):
+        calls = []
+
+        def fake_create(messages, timeout, token, dedicated=False):
+            calls.append(timeout)
+            time.sleep(0.1)
+            return "answer"
+
+        with mock.patch.object(openai_api, "_create", fake_create):
+            threads = [threading.Thread(target=openai_api.call_openai, args=("同一个问题", site))
+                       for site in ("summary", "summary", "reminder")]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        self.assertEqual(len(calls), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import sqlite3
+import unittest
+from datetime import date, datetime
+from utils.time_utils import parse_date, to_epoch, week_window
+from utils.db_utils import (
+    ensure_time_columns, backfill_time_columns, reminders_due_today, reminders_due_this_week, reminders_overdue,
+    reminders_undated, conversations_between
+)
+
+
+def make_legacy_db():
+    # 迁移前的表结构：时间只有 TEXT 列
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    conn.executescript("""
+        CREATE TABLE reminders (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, title TEXT,
+            description TEXT, due_date TEXT, priority TEXT, status TEXT, created_at TEXT, updated_at TEXT);
+        CREATE TABLE conversations (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, group_id INTEGER,
+            role TEXT, content TEXT, timestamp TEXT, tags TEXT);
+    """)
+    conn.executemany(
+        "INSERT INTO reminders (user_id, title, due_date, status) VALUES (?, ?, ?, ?)",
+        [
+            (1, "overdue", "2024-06-05", "待办"),
+            (1, "today", "2024/06/12", "待办"),
+            (1, "later this week", "2024年6月16日", "待办"),
+            (1, "next week", "2024-06-20", "待办"),
+            (1, "done", "2024-06-12", "已完成"),
+            (1, "undated", "", "待办"),
+        ]
+    )
+    conn.executemany(
+        "INSERT INTO conversations (user_id, group_id, role, content, timestamp) VALUES (?, ?, ?, ?, ?)",
+        [(1, 1, "user", "a", "2024-06-01 10:00:00"), (1, 1, "user", "b", "2024-06-10 10:00:00")]
+    )
+    return conn
+
+
+class TestTimeWindow(unittest.TestCase):
+    def test_parse_date_formats(self):
+        expected = datetime(2024, 6, 12)
+        for s in ("2024-06-12", "2024/06/12", "2024年6月12日", "20240612", "2024-06-12T00:00:00"):
+            self.assertEqual(parse_date(s), expected, s)
+        self.assertIsNone(parse_date("下周"))
+        self.assertIsNone(to_epoch(""))
+
+    def test_invalid_cjk_date_does_not_break_migration(self):
+        self.assertIsNone(parse_date("2024年2月30日"))
+        self.assertIsNone(to_epoch("2024年13月1日"))
+        conn = make_legacy_db()
+        conn.execute("INSERT INTO reminders (user_id, title, due_date, status) VALUES (1, 'bad', '2024年2月30日', '待办')")
+        ensure_time_columns(conn)
+        self.assertIn("bad", [r["title"] for r in reminders_undated(conn, 1)])
+
+    def test_triggers_keep_epoch_columns_in_sync(self):
+        conn = make_legacy_db()
+        ensure_time_columns(conn)
+        day = date(2024, 6, 12)
+        conn.execute("UPDATE reminders SET due_date='2024-06-12 09:00' WHERE title='next week'")
+        conn.execute("INSERT INTO reminders (user_id, title, due_date, status) VALUES (1, 'new', '2024/06/12', '待办')")
+        self.assertEqual([r["title"] for r in reminders_due_today(conn, 1, day)], ["today", "new", "next week"])
+        # SQLite 无法解析的格式先置 NULL，回填后恢复
+        conn.execute("UPDATE reminders SET due_date='2024年6月20日' WHERE title='new'")
+        self.assertIsNone(conn.execute("SELECT due_ts FROM reminders WHERE title='new'").fetchone()[0])
+        backfill_time_columns(conn)
+        self.assertEqual(conn.execute("SELECT due_ts FROM reminders WHERE title='new'").fetchone()[0],
+                         to_epoch("2024-06-20"))
+
+    def test_migration_backfills_and_windows(self):
+        conn = make_legacy_db()
+        ensure_time_columns(conn)
+        ensure_time_columns(conn)  # 可重复执行
+        day = date(2024, 6, 12)  # 周三
+        titles = lambda rows: [r["title"] for r in rows]
+        self.assertEqual(titles(reminders_due_today(conn, 1, day)), ["today"])
+        self.assertEqual(titles(reminders_due_this_week(conn, 1, day)), ["today", "later this week"])
+        self.assertEqual(titles(reminders_overdue(conn, 1, day)), ["overdue"])
+        self.assertEqual(titles(reminders_undated(conn, 1)), ["undated"])
+        rows = conversations_between(conn, 1, to_epoch("2024-06-05"), columns="content")
+        self.assertEqual([r[0] for r in rows], ["b"])
+
+    def test_window_query_uses_index(self):
+        conn = make_legacy_db()
+        ensure_time_columns(conn)
+        t0, t1 = week_window(date(2024, 6, 12))
+        plan = conn.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM reminders WHERE user_id=? AND status=? AND due_ts >= ? AND due_ts < ?",
+            (1, "待办", t0, t1)
+        ).fetchall()
+        self.assertIn("idx_reminders_user_status_due", " ".join(str(r[-1]) for r in plan))
+
+
+if __name__ == "__main__":
+    unittest.main()
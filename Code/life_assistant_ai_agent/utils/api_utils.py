@@ -1,7 +1,64 @@
 """
 第三方API调用工具，如天气、节日等。
 """
-def get_weather(location):
-    pass
+from datetime import date, datetime
+import requests
+from utils.jp_holidays import holiday_name
+
+WEATHER_API_URL = "https://wttr.in/{location}"
+
+# 季节性活动（离线数据），按月份索引
+SEASONAL_EVENTS = {
+    1: ["初詣", "冬季打折季"],
+    2: ["梅花祭", "雪祭"],
+    3: ["早樱赏花", "毕业季"],
+    4: ["赏樱（花見）", "新学期/入职季"],
+    5: ["黄金周出游", "新绿登山"],
+    6: ["紫阳花观赏", "梅雨季室内活动"],
+    7: ["花火大会", "夏日祭"],
+    8: ["花火大会", "盂兰盆节（お盆）"],
+    9: ["赏月（お月見）", "秋季美食节"],
+    10: ["红叶初见", "万圣节活动"],
+    11: ["赏红叶（紅葉狩り）", "学园祭"],
+    12: ["圣诞灯饰（イルミネーション）", "年末集市"],
+}
+
+
+def _to_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value)[:10], "%Y-%m-%d").date()
+
+
+def get_weather(location, timeout=3):
+    """
+    查询当前天气（wttr.in JSON 接口），返回 dict。
+    """
+    resp = requests.get(WEATHER_API_URL.format(location=location), params={"format": "j1"}, timeout=timeout)
+    resp.raise_for_status()
+    current = resp.json()["current_condition"][0]
+    return {
+        "location": location,
+        "description": current["weatherDesc"][0]["value"],
+        "temp_c": float(current["temp_C"]),
+        "feels_like_c": float(current["FeelsLikeC"]),
+        "humidity": int(current["humidity"]),
+    }
+
+
 def get_holiday(date, country='JP'):
-    pass
\ No newline at end of file
+    """
+    查询某天是否为节假日，返回节日名称，非节日返回 None。目前仅支持日本（离线表）。
+    """
+    if country != 'JP':
+        return None
+    return holiday_name(_to_date(date))
+
+
+def get_events(location, date):
+    """
+    返回当地当月的季节性活动列表（离线数据）。
+    """
+    return list(SEASONAL_EVENTS.get(_to_date(date).month, []))
@@ -0,0 +1,44 @@
+"""
+简单的线程安全 TTL 缓存。
+"""
+import threading
+import time
+
+
+class TTLCache:
+    """
+    带过期时间的内存缓存，超过 maxsize 时淘汰最早写入的条目。
+    """
+    def __init__(self, ttl=600, maxsize=1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._data = {}
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] <= now:
+                if item is not None:
+                    del self._data[key]
+                self.stats["misses"] += 1
+                return default
+            self.stats["hits"] += 1
+            return item[1]
+
+    def set(self, key, value, ttl=None):
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (expires, value)
+            while len(self._data) > self.maxsize:
+                del self._data[next(iter(self._data))]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
@@ -0,0 +1,160 @@
+"""
+数据库工具：时间列规范化迁移与时间窗口查询。
+reminders.due_ts / conversations.timestamp_ts 为 epoch 秒（INTEGER），由原 TEXT 列解析回填，
+配合 (user_id, status, due_ts) / (user_id, timestamp_ts) 索引，"今天/本周/已过期/最近N天" 均可走索引范围扫描。
+之后的写入由触发器保持同步，迁移每个数据库文件每进程只执行一次。
+"""
+import threading
+from utils.time_utils import to_epoch, day_window, week_window, last_days_window
+
+TIME_COLUMNS = {
+    # 表名: (规范化列, 原始 TEXT 列)
+    "reminders": ("due_ts", "due_date"),
+    "conversations": ("timestamp_ts", "timestamp"),
+}
+
+# 早期数据库缺少、由迁移补充的其他列：表名 -> [(列名, 类型)]
+EXTRA_COLUMNS = {
+    "users": [("extra_information", "TEXT")],
+}
+
+TIME_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_reminders_user_status_due ON reminders (user_id, status, due_ts)",
+    "CREATE INDEX IF NOT EXISTS idx_conversations_user_ts ON conversations (user_id, timestamp_ts)",
+    # 部分索引：只索引尚未回填的行，使重复执行迁移时的回填查询无需全表扫描
+    "CREATE INDEX IF NOT EXISTS idx_reminders_due_ts_null ON reminders (id) WHERE due_ts IS NULL",
+    "CREATE INDEX IF NOT EXISTS idx_conversations_ts_null ON conversations (id) WHERE timestamp_ts IS NULL",
+]
+
+
+# 触发器中只用 SQLite 内置函数（不依赖 to_epoch 自定义函数，其他工具写库时也能触发）：
+# 识别 'YYYY-MM-DD' / 'YYYY/MM/DD' 开头的时间，按本地时间换算 epoch；不存在的日期（如 2月30日）为 NULL。
+# 其他格式（如 'YYYY年M月D日'）先置 NULL，由 backfill_time_columns 用 to_epoch 补齐。
+_SQL_EPOCH = (
+    "CASE WHEN {v} GLOB '[0-9][0-9][0-9][0-9][-/][0-9][0-9][-/][0-9][0-9]*'"
+    " AND date(julianday(replace({v}, '/', '-'))) = substr(replace({v}, '/', '-'), 1, 10)"
+    " THEN CAST(strftime('%s', replace({v}, '/', '-'), 'utc') AS INTEGER) END"
+)
+
+
+def _time_triggers(table, ts_col, text_col):
+    expr = _SQL_EPOCH.format(v=f"NEW.{text_col}")
+    return [
+        # 插入时已给出规范化列（如 MemoryAgent 保存对话）则保留，否则由原 TEXT 列计算
+        f"""CREATE TRIGGER IF NOT EXISTS trg_{table}_{ts_col}_insert AFTER INSERT ON {table}
+            WHEN NEW.{ts_col} IS NULL AND NEW.{text_col} IS NOT NULL
+            BEGIN UPDATE {table} SET {ts_col} = {expr} WHERE id = NEW.id; END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_{table}_{ts_col}_update AFTER UPDATE OF {text_col} ON {table}
+            BEGIN UPDATE {table} SET {ts_col} = {expr} WHERE id = NEW.id; END""",
+    ]
+
+
+TIME_TRIGGERS = [sql for table, cols in TIME_COLUMNS.items() for sql in _time_triggers(table, *cols)]
+
+_migrated = set()
+_migrate_lock = threading.Lock()
+
+
+def _columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def _db_file(conn):
+    # 内存数据库返回 ''，每个连接都是独立的库
+    return next((row[2] for row in conn.execute("PRAGMA database_list") if row[1] == "main"), "")
+
+
+def backfill_time_columns(conn):
+    """
+    用 to_epoch 回填规范化列为 NULL 的行（走部分索引，只处理未回填的行）。
+    批量导入或触发器无法解析的格式写入后调用。
+    """
+    conn.create_function("to_epoch", 1, to_epoch, deterministic=True)
+    with conn:
+        for table, (ts_col, text_col) in TIME_COLUMNS.items():
+            conn.execute(
+                f"UPDATE {table} SET {ts_col} = to_epoch({text_col}) WHERE {ts_col} IS NULL AND {text_col} IS NOT NULL"
+            )
+
+
+def ensure_time_columns(conn):
+    """
+    迁移：补充规范化时间列（及 EXTRA_COLUMNS 中的缺失列）、建同步触发器和索引、回填历史数据。
+    同一数据库文件每进程只迁移一次，之后构造 Agent 不再开写事务。
+    """
+    db_file = _db_file(conn)
+    with _migrate_lock:
+        if db_file and db_file in _migrated:
+            return
+        with conn:
+            for table, (ts_col, _) in TIME_COLUMNS.items():
+                if ts_col not in _columns(conn, table):
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {ts_col} INTEGER")
+            for table, columns in EXTRA_COLUMNS.items():
+                existing = _columns(conn, table)
+                for name, col_type in columns:
+                    # 表不存在时 existing 为空，跳过
+                    if existing and name not in existing:
+                        conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {col_type}")
+            for sql in TIME_TRIGGERS + TIME_INDEXES:
+                conn.execute(sql)
+        backfill_time_columns(conn)
+        if db_file:
+            _migrated.add(db_file)
+
+
+def reminders_due_between(conn, user_id, t0=None, t1=None, status="待办"):
+    """
+    查询 due_ts 落在 [t0, t1) 的提醒事项，t0/t1 为 None 表示不设下/上界。
+    """
+    sql = "SELECT * FROM reminders WHERE user_id=? AND status=?"
+    params = [user_id, status]
+    if t0 is not None:
+        sql += " AND due_ts >= ?"
+        params.append(t0)
+    if t1 is not None:
+        sql += " AND due_ts < ?"
+        params.append(t1)
+    sql += " ORDER BY due_ts ASC"
+    return conn.execute(sql, params).fetchall()
+
+
+def reminders_due_today(conn, user_id, day=None):
+    return reminders_due_between(conn, user_id, *day_window(day))
+
+
+def reminders_due_this_week(conn, user_id, day=None):
+    return reminders_due_between(conn, user_id, *week_window(day))
+
+
+def reminders_overdue(conn, user_id, day=None):
+    """到期日早于今天且仍为待办的提醒事项"""
+    return reminders_due_between(conn, user_id, None, day_window(day)[0])
+
+
+def reminders_undated(conn, user_id, status="待办"):
+    """due_date 为空或无法解析的提醒事项"""
+    return conn.execute(
+        "SELECT * FROM reminders WHERE user_id=? AND status=? AND due_ts IS NULL ORDER BY id ASC",
+        (user_id, status)
+    ).fetchall()
+
+
+def conversations_between(conn, user_id, t0, t1=None, limit=None, columns="*"):
+    """
+    查询 timestamp_ts 落在 [t0, t1) 的对话，按时间正序返回；limit 取区间内最近的若干条。
+    """
+    sql = f"SELECT {columns} FROM conversations WHERE user_id=? AND timestamp_ts >= ?"
+    params = [user_id, t0]
+    if t1 is not None:
+        sql += " AND timestamp_ts < ?"
+        params.append(t1)
+    sql += " ORDER BY timestamp_ts DESC, id DESC"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+    return list(reversed(conn.execute(sql, params).fetchall()))
+
+
+def conversations_active_in_last(conn, user_id, days, limit=None, columns="*"):
+    return conversations_between(conn, user_id, *last_days_window(days), limit=limit, columns=columns)
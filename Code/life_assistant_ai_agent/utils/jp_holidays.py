@@ -0,0 +1,84 @@
+"""
+日本国民の祝日（离线表）：按现行《国民の祝日に関する法律》规则预先计算，无需调用外部 API。
+包含振替休日与国民の休日；2020/2021 年奥运特例单独处理。
+"""
+from datetime import date, timedelta
+
+# 预计算的年份范围，即现行规则适用的年份：2020 年起天皇誕生日改为 2/23，
+# 2019 年及以前规则不同；春分/秋分每年由官方公布，远期年份也可能变动
+TABLE_YEARS = range(2020, 2036)
+
+
+def _nth_monday(year, month, n):
+    first = date(year, month, 1)
+    offset = (7 - first.weekday()) % 7  # 当月第一个周一
+    return first + timedelta(days=offset + 7 * (n - 1))
+
+
+def _equinox_day(year, base):
+    # 1980-2099 年适用的春分/秋分近似公式
+    return int(base + 0.242194 * (year - 1980) - (year - 1980) // 4)
+
+
+def _base_holidays(year):
+    days = {
+        date(year, 1, 1): "元日",
+        _nth_monday(year, 1, 2): "成人の日",
+        date(year, 2, 11): "建国記念の日",
+        date(year, 2, 23): "天皇誕生日",
+        date(year, 3, _equinox_day(year, 20.8431)): "春分の日",
+        date(year, 4, 29): "昭和の日",
+        date(year, 5, 3): "憲法記念日",
+        date(year, 5, 4): "みどりの日",
+        date(year, 5, 5): "こどもの日",
+        _nth_monday(year, 9, 3): "敬老の日",
+        date(year, 9, _equinox_day(year, 23.2488)): "秋分の日",
+        date(year, 11, 3): "文化の日",
+        date(year, 11, 23): "勤労感謝の日",
+    }
+    # 东京奥运特例
+    if year == 2020:
+        days.update({date(2020, 7, 23): "海の日", date(2020, 7, 24): "スポーツの日", date(2020, 8, 10): "山の日"})
+    elif year == 2021:
+        days.update({date(2021, 7, 22): "海の日", date(2021, 7, 23): "スポーツの日", date(2021, 8, 8): "山の日"})
+    else:
+        days.update({
+            _nth_monday(year, 7, 3): "海の日",
+            date(year, 8, 11): "山の日",
+            _nth_monday(year, 10, 2): "スポーツの日",
+        })
+    return days
+
+
+def holidays_for_year(year):
+    """
+    计算某年的全部祝日，返回 {date: 名称}。年份不在 TABLE_YEARS 内时抛出 ValueError。
+    """
+    if year not in TABLE_YEARS:
+        raise ValueError(f"{year} is outside the supported range {TABLE_YEARS.start}-{TABLE_YEARS.stop - 1}")
+    days = _base_holidays(year)
+    # 国民の休日：前后两天均为祝日的平日
+    for d in sorted(days):
+        mid = d + timedelta(days=1)
+        if mid not in days and mid + timedelta(days=1) in days and mid.weekday() != 6:
+            days[mid] = "国民の休日"
+    # 振替休日：祝日逢周日，顺延到之后第一个非祝日
+    for d in sorted(days):
+        if d.weekday() == 6:
+            sub = d + timedelta(days=1)
+            while sub in days:
+                sub += timedelta(days=1)
+            days[sub] = "振替休日"
+    return dict(sorted(days.items()))
+
+
+JP_HOLIDAYS = {}
+for _year in TABLE_YEARS:
+    JP_HOLIDAYS.update(holidays_for_year(_year))
+
+
+def holiday_name(day):
+    """
+    查询某天的祝日名称，非祝日或年份超出 TABLE_YEARS（无法确定）时返回 None。
+    """
+    return JP_HOLIDAYS.get(day)
@@ -0,0 +1,108 @@
+"""
+紧凑的对话消息表示：Message 使用 __slots__、角色字符串驻留（intern），并用 preamble 标记
+系统提示/用户画像/记忆摘要等前置消息，取代对 content 前缀的 startswith 判断。
+MessageHistory 缓存每条消息转换后的 SDK 格式，每轮只转换新追加的消息，
+并维护增量哈希作为请求合并的 key，使每轮开销不随会话长度增长。
+"""
+import hashlib
+import json
+import sys
+
+ROLE_SYSTEM = sys.intern("system")
+ROLE_USER = sys.intern("user")
+ROLE_ASSISTANT = sys.intern("assistant")
+CHAT_ROLES = (ROLE_USER, ROLE_ASSISTANT)
+
+
+def convert_message(role, content):
+    """
+    转为新版 SDK 的消息格式：content 为字符串时包装为 [{type: "text", text: ...}]。
+    """
+    # 如果 content 已经是 list（新版格式），直接返回
+    if isinstance(content, list):
+        return {"role": role, "content": content}
+    return {"role": role, "content": [{"type": "text", "text": content}]}
+
+
+class Message:
+    __slots__ = ("role", "content", "preamble", "_payload")
+
+    def __init__(self, role, content, preamble=False):
+        self.role = sys.intern(role)
+        self.content = content
+        self.preamble = preamble
+        self._payload = None
+
+    def to_sdk(self):
+        if self._payload is None:
+            self._payload = convert_message(self.role, self.content)
+        return self._payload
+
+    def to_dict(self):
+        return {"role": self.role, "content": self.content}
+
+    def __getitem__(self, key):
+        # 兼容旧代码中 msg["role"] / msg["content"] 的写法
+        if key not in ("role", "content"):
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __repr__(self):
+        return f"Message({self.role!r}, {self.content!r}, preamble={self.preamble})"
+
+
+class MessageHistory:
+    """
+    追加式的消息列表。sdk_payload() 返回缓存的 SDK 消息列表（调用方不应修改），
+    digest() 返回整个历史的链式哈希，均只对新追加的消息做增量计算。
+    """
+    def __init__(self, messages=()):
+        self._items = []
+        self._payload = []
+        self._chain = []
+        for m in messages:
+            self.append(m)
+
+    def append(self, message):
+        if not isinstance(message, Message):
+            message = Message(message["role"], message["content"])
+        prev = self._chain[-1] if self._chain else b""
+        content = message.content if isinstance(message.content, str) else json.dumps(message.content, sort_keys=True)
+        h = hashlib.sha256(prev)
+        h.update(message.role.encode())
+        h.update(b"\0")
+        h.update(content.encode("utf-8"))
+        self._chain.append(h.digest())
+        self._items.append(message)
+
+    def pop(self):
+        message = self._items.pop()
+        self._chain.pop()
+        del self._payload[len(self._items):]
+        return message
+
+    def clear(self):
+        self._items.clear()
+        self._payload.clear()
+        self._chain.clear()
+
+    def sdk_payload(self):
+        for m in self._items[len(self._payload):]:
+            self._payload.append(m.to_sdk())
+        return self._payload
+
+    def digest(self):
+        return self._chain[-1].hex() if self._chain else ""
+
+    def chat_messages(self):
+        """不含前置消息的用户/助手消息"""
+        return [m for m in self._items if m.role in CHAT_ROLES and not m.preamble]
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __getitem__(self, index):
+        return self._items[index]
@@ -1,5 +1,10 @@
+import asyncio
 import openai
 import os
+import threading
+from utils.single_flight import SingleFlight, AsyncSingleFlight, make_key
+from utils.messages import Message, MessageHistory, convert_message
+from utils.resilience import ResiliencePolicy, call_with_resilience, acall_with_resilience
 
 # =================== 旧实现 ===================
 # def call_openai(prompt):
@@ -18,23 +23,19 @@ import os
 # 说明：旧实现只支持 content 为字符串，遇到多轮对话或新版 SDK 时会因缺少 type 字段报错。
 
 # =================== 新实现 ===================
-def _convert_message(msg):
-    # 如果 content 已经是 list（新版格式），直接返回
-    if isinstance(msg["content"], list):
-        return msg
-    # 否则转为新版格式
-    return {
-        "role": msg["role"],
-        "content": [{"type": "text", "text": msg["content"]}]
-    }
+MODEL = "gpt-4o"
+TEMPERATURE = 0.7
+MAX_TOKENS = 512
 
-def call_openai(messages):
-    """
-    兼容新版 openai>=1.0.0 SDK 的消息格式，自动将 content 转为 [{type: "text", text: ...}]。
-    支持多轮历史和新版 SDK。
-    """
-    api_key = os.getenv("OPENAI_API_KEY")
-    client = openai.OpenAI(api_key=api_key)
+# 进程内请求合并：多个会话/批处理同时发起相同请求时，只调用一次上游并共享结果
+_inflight = SingleFlight()
+_async_inflight = AsyncSingleFlight()
+
+
+def _normalize_messages(messages):
+    # MessageHistory 缓存了已转换的消息，只转换新追加的部分
+    if isinstance(messages, MessageHistory):
+        return messages.sdk_payload()
     # 如果传入的是字符串 prompt，自动转为单轮消息
     if isinstance(messages, str):
         messages = [
@@ -42,11 +43,130 @@ def call_openai(messages):
             {"role": "user", "content": messages}
         ]
     # 统一转换所有消息
-    messages = [_convert_message(m) for m in messages]
-    response = client.chat.completions.create(
-        model="gpt-4o",
+    return [m.to_sdk() if isinstance(m, Message) else convert_message(m["role"], m["content"]) for m in messages]
+
+
+def _request_key(messages, payload, call_site):
+    # 调用点决定截止时间/重试/对冲策略与统计，不同调用点的相同请求不合并
+    # MessageHistory 使用增量维护的链式哈希，避免每轮序列化整个历史
+    if isinstance(messages, MessageHistory):
+        return make_key(MODEL, TEMPERATURE, MAX_TOKENS, call_site, {"history": messages.digest()})
+    return make_key(MODEL, TEMPERATURE, MAX_TOKENS, call_site, payload)
+
+
+# 各调用点的弹性策略：整体截止时间、单次尝试超时、重试次数、是否对冲。
+# 单次尝试超时明显短于截止时间，卡住的请求可以在截止时间内重试
+_RETRYABLE = (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError)
+CALL_SITE_POLICIES = {
+    "chat": ResiliencePolicy(deadline=45, attempt_timeout=20, max_retries=3, hedge=True, hedge_after=10, retry_on=_RETRYABLE),
+    "summary": ResiliencePolicy(deadline=90, attempt_timeout=40, max_retries=3, retry_on=_RETRYABLE),
+    "profile": ResiliencePolicy(deadline=90, attempt_timeout=40, max_retries=3, retry_on=_RETRYABLE),
+    "reminder": ResiliencePolicy(deadline=60, attempt_timeout=25, max_retries=3, retry_on=_RETRYABLE),
+    "recommend": ResiliencePolicy(deadline=30, attempt_timeout=12, max_retries=2, hedge=True, hedge_after=8, retry_on=_RETRYABLE),
+    "default": ResiliencePolicy(deadline=60, attempt_timeout=25, max_retries=3, retry_on=_RETRYABLE),
+}
+
+
+def _policy(call_site):
+    return CALL_SITE_POLICIES.get(call_site, CALL_SITE_POLICIES["default"])
+
+
+# 共享客户端：复用连接池与 TLS 连接，每次调用通过 with_options 设置本次超时。
+# 重试由弹性层统一负责，关闭 SDK 自带的重试。
+_client = None
+_client_lock = threading.Lock()
+_async_client = None  # (事件循环, AsyncOpenAI)，httpx 异步连接池绑定创建它的事件循环
+
+
+def _shared_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
+        return _client
+
+
+def _shared_async_client():
+    global _async_client
+    loop = asyncio.get_running_loop()
+    if _async_client is None or _async_client[0] is not loop:
+        _async_client = (loop, openai.AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0))
+    return _async_client[1]
+
+
+def _create(messages, timeout, token, dedicated=False):
+    """
+    :param dedicated: 使用独立客户端，取消时关闭其连接以中断请求（对冲请求在守护线程中执行，落败方需要）；
+        否则使用共享客户端，请求在调用方线程内执行，由本次尝试的超时结束
+    """
+    if dedicated:
+        client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"), timeout=timeout, max_retries=0)
+        token.on_cancel(client.close)
+    else:
+        client = _shared_client().with_options(timeout=timeout)
+    try:
+        response = client.chat.completions.create(
+            model=MODEL,
+            messages=messages,
+            temperature=TEMPERATURE,
+            max_tokens=MAX_TOKENS
+        )
+    finally:
+        if dedicated:
+            client.close()
+    return response.choices[0].message.content.strip()
+
+
+async def _acreate(messages, timeout, token):
+    # 异步路径通过 Task.cancel() 取消，无需独立客户端
+    response = await _shared_async_client().with_options(timeout=timeout).chat.completions.create(
+        model=MODEL,
         messages=messages,
-        temperature=0.7,
-        max_tokens=512
+        temperature=TEMPERATURE,
+        max_tokens=MAX_TOKENS
     )
-    return response.choices[0].message.content.strip()
\ No newline at end of file
+    return response.choices[0].message.content.strip()
+
+
+def _resilient_create(messages, policy):
+    return call_with_resilience(lambda timeout, token: _create(messages, timeout, token, policy.hedge), policy)
+
+
+async def _aresilient_create(messages, policy):
+    return await acall_with_resilience(lambda timeout, token: _acreate(messages, timeout, token), policy)
+
+
+def call_openai(messages, call_site="default"):
+    """
+    兼容新版 openai>=1.0.0 SDK 的消息格式，自动将 content 转为 [{type: "text", text: ...}]。
+    支持多轮历史和新版 SDK。相同请求在途时合并为一次上游调用。
+    :param call_site: 调用点名称（chat/summary/profile/reminder/recommend），决定截止时间、重试与对冲策略
+    超过截止时间抛出 DeadlineExceeded，不可重试或重试耗尽时抛出最后一次的异常。
+    """
+    payload = _normalize_messages(messages)
+    return _inflight.do(_request_key(messages, payload, call_site), _resilient_create, payload, _policy(call_site))
+
+
+async def acall_openai(messages, call_site="default"):
+    """
+    call_openai 的 asyncio 版本，同一事件循环内的相同在途请求合并为一次上游调用。
+    """
+    payload = _normalize_messages(messages)
+    return await _async_inflight.do(_request_key(messages, payload, call_site), _aresilient_create, payload, _policy(call_site))
+
+
+def get_resilience_stats():
+    """
+    返回各调用点的弹性统计：重试、Retry-After、对冲发起/胜出、超时、失败次数，以及当前对冲触发延迟。
+    """
+    return {
+        site: dict(p.stats, hedge_delay=p.hedge_delay() if p.hedge else None)
+        for site, p in CALL_SITE_POLICIES.items()
+    }
+
+
+def get_coalesce_stats():
+    """
+    返回请求合并统计：calls 总调用数，executed 实际上游调用数，coalesced 被合并的重复调用数。
+    """
+    return {"sync": dict(_inflight.stats), "async": dict(_async_inflight.stats)}
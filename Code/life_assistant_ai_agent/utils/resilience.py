@@ -0,0 +1,310 @@
+"""
+上游调用的弹性层：整体截止时间（deadline）、单次尝试超时（卡住的请求在截止时间内重试）、
+带抖动的指数退避重试（遵守 Retry-After），以及可选的对冲请求（hedged request）：首个请求超过 p95 延迟仍未返回时再发一个相同请求，
+先成功者胜出，另一个被取消。提供线程版 call_with_resilience 与 asyncio 版 acall_with_resilience。
+
+attempt 函数签名：attempt(timeout, token)，timeout 为本次尝试允许的秒数，
+token 为 CancelToken，attempt 可通过 token.on_cancel(fn) 注册取消动作（如关闭 HTTP 连接）。
+"""
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+from email.utils import parsedate_to_datetime
+
+RETRY_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+class ResiliencePolicy:
+    """
+    :param deadline: 整个调用（含重试）的最长耗时（秒）
+    :param attempt_timeout: 单次尝试的最长耗时（秒），超时视为可重试错误；None 表示不超过剩余截止时间
+    :param max_retries: 最多重试次数
+    :param base_delay / max_delay: 指数退避的基数与上限（秒），实际等待为 [0, 上限] 的随机值
+    :param hedge: 是否启用对冲请求
+    :param hedge_after: 样本不足时的对冲触发延迟（秒）；样本足够后使用观测到的 p95
+    :param retry_on: 额外视为可重试的异常类型
+    """
+    def __init__(self, deadline=60.0, max_retries=3, base_delay=0.5, max_delay=8.0,
+                 hedge=False, hedge_after=8.0, retry_on=(), attempt_timeout=None):
+        self.deadline = deadline
+        self.attempt_timeout = attempt_timeout
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge = hedge
+        self.hedge_after = hedge_after
+        self.retry_on = tuple(retry_on)
+        self.latency = LatencyTracker()
+        self.stats = {
+            "calls": 0, "success": 0, "failures": 0, "retries": 0, "retry_after_honored": 0,
+            "hedges": 0, "hedge_wins": 0, "deadline_exceeded": 0,
+        }
+        self._lock = threading.Lock()
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.stats[name] += n
+
+    def attempt_end(self, now, end):
+        """本次尝试的截止时刻：不晚于整体截止时间"""
+        return end if self.attempt_timeout is None else min(end, now + self.attempt_timeout)
+
+    def hedge_delay(self):
+        p95 = self.latency.percentile(0.95)
+        return p95 if p95 is not None else self.hedge_after
+
+    def backoff(self, attempt):
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+class LatencyTracker:
+    """最近 window 次成功调用的延迟，用于估计 p95"""
+    def __init__(self, window=200, min_samples=20):
+        self._samples = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def add(self, seconds):
+        self._samples.append(seconds)
+
+    def percentile(self, q):
+        samples = sorted(self._samples)
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+class CancelToken:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._callbacks = []
+        self.cancelled = False
+
+    def on_cancel(self, fn):
+        with self._lock:
+            if not self.cancelled:
+                self._callbacks.append(fn)
+                return
+        fn()
+
+    def cancel(self):
+        with self._lock:
+            if self.cancelled:
+                return
+            self.cancelled = True
+            callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            try:
+                fn()
+            except Exception:
+                pass
+
+
+def is_retryable(exc, policy):
+    if isinstance(exc, policy.retry_on) or isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    status = getattr(exc, "status_code", None)
+    return status in RETRY_STATUS
+
+
+def retry_after_seconds(exc):
+    """
+    从异常附带的响应头中读取 Retry-After（秒数或 HTTP 日期）/ retry-after-ms，没有则返回 None。
+    """
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+    ms = headers.get("retry-after-ms")
+    if ms:
+        try:
+            return float(ms) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+def _next_delay(exc, attempt, policy):
+    delay = retry_after_seconds(exc)
+    if delay is not None:
+        policy.count("retry_after_honored")
+        return delay
+    return policy.backoff(attempt)
+
+
+def _start_attempt(attempt, timeout, token):
+    """
+    在守护线程中执行一次尝试并返回 Future。守护线程不会在解释器退出时被等待，
+    Ctrl-C 退出不会卡在仍在进行的对冲请求上。
+    """
+    fut = Future()
+
+    def run():
+        if not fut.set_running_or_notify_cancel():
+            return
+        try:
+            fut.set_result(attempt(timeout, token))
+        except BaseException as e:
+            fut.set_exception(e)
+
+    threading.Thread(target=run, name="hedge", daemon=True).start()
+    return fut
+
+
+def _attempt_timed_out(policy, attempt_end, end):
+    if attempt_end < end:
+        return TimeoutError(f"attempt timed out after {policy.attempt_timeout}s")
+    return DeadlineExceeded(f"deadline of {policy.deadline}s exceeded")
+
+
+def _once(attempt, policy, end):
+    """
+    不对冲时在调用方线程内直接执行，超时由 attempt 自身的 timeout 保证（如 HTTP 客户端超时）。
+    """
+    start = time.monotonic()
+    attempt_end = policy.attempt_end(start, end)
+    result = attempt(attempt_end - start, CancelToken())
+    policy.latency.add(time.monotonic() - start)
+    return result
+
+
+def _hedged_once(attempt, policy, end):
+    """
+    发起一次对冲请求，返回首个成功结果；全部失败时抛出最后一个异常。
+    """
+    start = time.monotonic()
+    attempt_end = policy.attempt_end(start, end)
+    tokens = [CancelToken()]
+    futures = {_start_attempt(attempt, attempt_end - start, tokens[0]): tokens[0]}
+    done, _ = wait(futures, timeout=min(policy.hedge_delay(), max(0.0, attempt_end - time.monotonic())))
+    if not done and time.monotonic() < attempt_end:
+        policy.count("hedges")
+        token = CancelToken()
+        futures[_start_attempt(attempt, attempt_end - time.monotonic(), token)] = token
+    pending = set(futures)
+    error = None
+    primary = next(iter(futures))
+    while pending:
+        done, pending = wait(pending, timeout=max(0.0, attempt_end - time.monotonic()), return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        for fut in done:
+            if fut.exception() is None:
+                for other in pending:
+                    futures[other].cancel()
+                    other.cancel()
+                if fut is not primary:
+                    policy.count("hedge_wins")
+                policy.latency.add(time.monotonic() - start)
+                return fut.result()
+            error = fut.exception()
+    for fut in pending:
+        futures[fut].cancel()
+        fut.cancel()
+    raise error or _attempt_timed_out(policy, attempt_end, end)
+
+
+def call_with_resilience(attempt, policy):
+    """
+    线程版：在 policy.deadline 内按退避策略重试 attempt，可选对冲请求。
+    不对冲时 attempt 在调用方线程内执行，对冲时各请求在守护线程中执行。
+    """
+    policy.count("calls")
+    end = time.monotonic() + policy.deadline
+    once = _hedged_once if policy.hedge else _once
+    for n in range(policy.max_retries + 1):
+        try:
+            result = once(attempt, policy, end)
+            policy.count("success")
+            return result
+        except Exception as e:
+            error = e
+            if not is_retryable(e, policy) or n == policy.max_retries:
+                break
+            delay = _next_delay(e, n, policy)
+            if time.monotonic() + delay >= end:
+                break
+            policy.count("retries")
+            time.sleep(delay)
+    policy.count("failures")
+    if time.monotonic() >= end or isinstance(error, DeadlineExceeded):
+        policy.count("deadline_exceeded")
+        if not isinstance(error, DeadlineExceeded):
+            raise DeadlineExceeded(f"deadline of {policy.deadline}s exceeded") from error
+    raise error
+
+
+async def _ahedged_once(attempt, policy, end):
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    attempt_end = policy.attempt_end(start, end)
+    primary = asyncio.ensure_future(attempt(attempt_end - start, CancelToken()))
+    tasks = {primary}
+    try:
+        if policy.hedge:
+            done, _ = await asyncio.wait(tasks, timeout=min(policy.hedge_delay(), max(0.0, attempt_end - loop.time())))
+            if not done and loop.time() < attempt_end:
+                policy.count("hedges")
+                tasks.add(asyncio.ensure_future(attempt(attempt_end - loop.time(), CancelToken())))
+        pending = set(tasks)
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, timeout=max(0.0, attempt_end - loop.time()),
+                                               return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                break
+            for task in done:
+                if task.exception() is None:
+                    if task is not primary:
+                        policy.count("hedge_wins")
+                    policy.latency.add(loop.time() - start)
+                    return task.result()
+                error = task.exception()
+        raise error or _attempt_timed_out(policy, attempt_end, end)
+    finally:
+        # 取消仍在进行的请求（对冲失败方或超时的请求）
+        for task in tasks:
+            task.cancel()
+
+
+async def acall_with_resilience(attempt, policy):
+    """
+    asyncio 版：attempt 为 async 函数，取消通过 Task.cancel() 真正中断请求。
+    """
+    policy.count("calls")
+    loop = asyncio.get_running_loop()
+    end = loop.time() + policy.deadline
+    for n in range(policy.max_retries + 1):
+        try:
+            result = await _ahedged_once(attempt, policy, end)
+            policy.count("success")
+            return result
+        except Exception as e:
+            error = e
+            if not is_retryable(e, policy) or n == policy.max_retries:
+                break
+            delay = _next_delay(e, n, policy)
+            if loop.time() + delay >= end:
+                break
+            policy.count("retries")
+            await asyncio.sleep(delay)
+    policy.count("failures")
+    if loop.time() >= end or isinstance(error, DeadlineExceeded):
+        policy.count("deadline_exceeded")
+        if not isinstance(error, DeadlineExceeded):
+            raise DeadlineExceeded(f"deadline of {policy.deadline}s exceeded") from error
+    raise error
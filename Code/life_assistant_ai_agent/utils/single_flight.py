@@ -0,0 +1,115 @@
+"""
+请求合并（single-flight）：相同的在途请求只向上游发起一次，并发调用方等待并共享同一个结果。
+提供线程版 SingleFlight 与 asyncio 版 AsyncSingleFlight。
+"""
+import asyncio
+import json
+import threading
+
+
+def make_key(*args, **kwargs):
+    """
+    将请求参数规范化为稳定的字符串 key（dict 按键排序，非 JSON 类型转为字符串）。
+    """
+    return json.dumps([args, kwargs], sort_keys=True, ensure_ascii=False, default=str)
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    线程安全的请求合并：同一 key 在执行期间的重复调用会阻塞等待首个调用的结果。
+    调用结束后立即移除 key，不做结果缓存。
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.stats = {"calls": 0, "executed": 0, "coalesced": 0}
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            self.stats["calls"] += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self.stats["executed"] += 1
+            else:
+                self.stats["coalesced"] += 1
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+
+class _AsyncCall:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+
+class AsyncSingleFlight:
+    """
+    asyncio 版请求合并：同一事件循环内，重复 key 的协程共享同一个上游任务。
+    上游任务由合并组持有，所有调用方（包括首个）都通过 asyncio.shield 等待，
+    任一调用方被取消不影响其他调用方；全部调用方都取消时才取消上游任务。
+    """
+    def __init__(self):
+        self._calls = {}
+        self.stats = {"calls": 0, "executed": 0, "coalesced": 0}
+
+    async def do(self, key, coro_fn, *args, **kwargs):
+        self.stats["calls"] += 1
+        call = self._calls.get(key)
+        if call is None:
+            call = self._calls[key] = _AsyncCall(asyncio.ensure_future(coro_fn(*args, **kwargs)))
+            call.task.add_done_callback(lambda t: self._done(key, call))
+            self.stats["executed"] += 1
+        else:
+            self.stats["coalesced"] += 1
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if call.waiters == 1 and not call.task.done():
+                call.task.cancel()
+                # 之后到来的相同请求重新发起，而不是等待已取消的任务
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            raise
+        finally:
+            call.waiters -= 1
+
+    def _done(self, key, call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        if not call.task.cancelled():
+            call.task.exception()  # 标记已读取，避免无等待方时输出 "never retrieved" 警告
+
+    def in_flight(self):
+        return len(self._calls)
@@ -1,7 +1,103 @@
 """
 时间/日期处理工具。
+数据库中的 due_date / timestamp 为自由格式 TEXT，这里统一解析为本地时间，并换算为 epoch 秒，
+供 reminders.due_ts / conversations.timestamp_ts 等规范化列和时间窗口查询使用。
 """
+import re
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+
+_FORMATS = (
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d %H:%M",
+    "%Y-%m-%d",
+    "%Y/%m/%d %H:%M:%S",
+    "%Y/%m/%d %H:%M",
+    "%Y/%m/%d",
+    "%Y.%m.%d",
+    "%Y%m%d",
+)
+_CJK_DATE = re.compile(r"^(\d{4})年(\d{1,2})月(\d{1,2})日\s*(?:(\d{1,2})[:：时](\d{1,2})分?)?$")
+
+
+@lru_cache(maxsize=4096)
 def parse_date(date_str):
-    pass
+    """
+    解析日期/时间字符串，返回 datetime（无时区，本地时间）；无法解析时返回 None。
+    支持 ISO 8601、'YYYY-MM-DD[ HH:MM[:SS]]'、'YYYY/MM/DD'、'YYYY年M月D日' 等格式。
+    同一字符串重复出现时直接命中缓存。
+    """
+    if not date_str:
+        return None
+    s = str(date_str).strip()
+    try:
+        dt = datetime.fromisoformat(s)
+        # 带时区的时间统一转为本地时间
+        return dt.astimezone().replace(tzinfo=None) if dt.tzinfo else dt
+    except ValueError:
+        pass
+    for fmt in _FORMATS:
+        try:
+            return datetime.strptime(s, fmt)
+        except ValueError:
+            continue
+    m = _CJK_DATE.match(s)
+    if m:
+        y, mo, d, hh, mm = m.groups()
+        try:
+            return datetime(int(y), int(mo), int(d), int(hh or 0), int(mm or 0))
+        except ValueError:
+            # 格式正确但日期不存在，如 2024年2月30日
+            return None
+    return None
+
+
+def to_epoch(value):
+    """
+    将 datetime/date/字符串/数字 转为 epoch 秒（int），无法解析时返回 None。
+    也作为 SQLite 自定义函数用于回填，因此任何输入都不抛异常。
+    """
+    if value is None:
+        return None
+    try:
+        if isinstance(value, (int, float)):
+            return int(value)
+        if isinstance(value, datetime):
+            return int(value.timestamp())
+        if isinstance(value, date):
+            return int(datetime(value.year, value.month, value.day).timestamp())
+        dt = parse_date(value)
+        return int(dt.timestamp()) if dt else None
+    except (ValueError, OverflowError, OSError):
+        return None
+
+
 def get_today():
-    pass
\ No newline at end of file
+    return date.today()
+
+
+def day_window(day=None):
+    """
+    返回某天 [00:00, 次日00:00) 的 epoch 区间。
+    """
+    day = day or get_today()
+    start = datetime(day.year, day.month, day.day)
+    return int(start.timestamp()), int((start + timedelta(days=1)).timestamp())
+
+
+def week_window(day=None):
+    """
+    返回某天所在周（周一至周日）的 epoch 区间。
+    """
+    day = day or get_today()
+    monday = day - timedelta(days=day.weekday())
+    start = datetime(monday.year, monday.month, monday.day)
+    return int(start.timestamp()), int((start + timedelta(days=7)).timestamp())
+
+
+def last_days_window(days, now=None):
+    """
+    返回最近 days 天（截至 now）的 epoch 区间。
+    """
+    now = now or datetime.now()
+    return int((now - timedelta(days=days)).timestamp()), int(now.timestamp()) + 1
@@ -53,4 +53,16 @@ def parse_memory_summary_from_llm(llm_text):
             # fallback: 按分段文本解析
             return {"raw": llm_text}
     else:
-        return llm_text 
\ No newline at end of file
+        return llm_text
+
+def parse_combined_extraction_from_llm(llm_text):
+    """
+    解析画像+记忆摘要的合并输出：{"profile": {...}, "memory_summary": {...}}
+    :return: (profile_dict, summary_dict)，profile_dict 格式同 parse_user_profile_from_llm
+    """
+    data = extract_json_from_llm_output(llm_text) if isinstance(llm_text, str) else llm_text
+    profile = parse_user_profile_from_llm(data.get("profile") or {})
+    summary = data.get("memory_summary")
+    if not isinstance(summary, dict):
+        summary = {"raw": summary} if summary else {}
+    return profile, summary